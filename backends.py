@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+#
+# Demonspawn
+# a utility for quickly generating a slew of batch jobs
+# good for benchmarking, regression testing, and such
+#
+# Victor Eijkhout
+# copyright 2020-2022
+#
+# version 0.5, see the Readme for details
+#
+# backends.py : where the job scripts run: slurm, or processes on this machine
+#
+
+import atexit
+import os
+import re
+import shutil
+import signal
+import subprocess as sp
+import tempfile
+import threading
+import time
+
+def slurm_seconds(spec):
+  ## convert slurm [days-][hours:]minutes:seconds to seconds, None if unlimited/invalid
+  days = 0
+  if re.search("-",spec):
+    days,spec = spec.split("-",1)
+  try:
+    seconds = 0
+    for f in spec.split(":"):
+      seconds = 60*seconds+int(f)
+    return 86400*int(days)+seconds
+  except ValueError:
+    return None
+
+class SlurmCallFailed(Exception):
+  ## a slurm command that ran, but failed, for instance on a slurmctld timeout
+  pass
+
+##
+## a backend has the three slurm commands that demonspawn uses,
+## each returning the lines that the slurm command would print
+##
+class SlurmBackend():
+  name = "slurm"
+  def sbatch(self,script):
+    p = sp.run( ["sbatch",script],stdout=sp.PIPE,text=True )
+    return p.stdout.splitlines()
+  def squeue(self,user,format):
+    ## raises SlurmCallFailed, since empty output would mean that no job is in the queue
+    p = sp.run( ["squeue","-u",user,"-h","-r","-o",format],stdout=sp.PIPE,stderr=sp.PIPE,text=True )
+    if p.returncode!=0:
+      raise SlurmCallFailed(f"squeue exited with status {p.returncode}: {p.stderr.strip()}")
+    return p.stdout.splitlines()
+  def sacct(self,jobids,fields):
+    ## raises FileNotFoundError if there is no accounting
+    p = sp.run( ["sacct","-j",",".join(jobids),"-X","-n","-P","-o",",".join(fields)],
+                stdout=sp.PIPE,stderr=sp.DEVNULL,text=True )
+    return p.stdout.splitlines()
+  def __str__(self):
+    return "slurm"
+
+##
+## stand-ins for the parallel launchers: run the program once, on this machine
+##
+local_launchers = {
+  "ibrun":"""#!/bin/bash
+## ibrun [ -n ntasks ] [ -o offset ] program args
+while [ "${1:0:1}" = "-" ] ; do shift ; shift ; done
+exec "$@"
+""",
+  "srun":"""#!/bin/bash
+## srun [ --option=value ]... program args
+while [ "${1:0:1}" = "-" ] ; do shift ; done
+exec "$@"
+""" }
+
+def sbatch_options(script):
+  ## the #SBATCH lines of a job script as a dict
+  options = {}
+  with open(script,"r") as text:
+    for line in text:
+      if m := re.match(r'#SBATCH +(-[-a-zA-Z]+)[= ] *(\S+)',line):
+        options[ m.groups()[0] ] = m.groups()[1]
+  return options
+
+class LocalBackend():
+  #
+  # runs the job scripts as processes on this machine; how many run at a time is set by the
+  # queue limits, which hold back submissions, and optionally bounded by `workers';
+  # the slurm environment of a job on one node is emulated,
+  # and array elements are started respecting the %N throttle of the array
+  #
+  name = "local"
+  def __init__(self,workers=None):
+    self.workers = int(workers) if workers else None
+    ## job ids are deterministic; 1 would be taken for an unsubmitted job
+    self.jobs = {}; self.pending = []; self.next_id = 1000
+    self.lock = threading.Lock()
+    self.bindir = tempfile.mkdtemp(prefix="demonspawn-local-")
+    for launcher,text in local_launchers.items():
+      path = f"{self.bindir}/{launcher}"
+      with open(path,"w") as shim: shim.write(text)
+      os.chmod(path,0o755)
+    atexit.register(self.shutdown)
+  def sbatch(self,script):
+    options = sbatch_options(script)
+    with self.lock:
+      jobid = str(self.next_id); self.next_id += 1
+      common = { "script":os.path.abspath(script),"name":options.get("-J","job"),
+                 "partition":options.get("-p","local"),"nodes":int( options.get("-N","1") ),
+                 "ppn":int( options.get("--tasks-per-node","1") ),
+                 "limit":slurm_seconds( options.get("-t","UNLIMITED") ),
+                 "output":options.get("-o","slurm-%j.out"),"submit":time.time(),
+                 "start":None,"end":None,"exitcode":None,"state":"PENDING","process":None,
+                 "arrayid":None,"index":None,"throttle":None }
+      if array := options.get("--array",None):
+        ## 0-N%T: elements 0..N, at most T at a time
+        indices,_,throttle = array.partition("%")
+        first,_,last = indices.partition("-")
+        for index in range( int(first),int(last or first)+1 ):
+          self.add( f"{jobid}_{index}",dict( common,arrayid=jobid,index=index,
+                                              throttle=int(throttle) if throttle else None ) )
+      else:
+        self.add(jobid,common)
+      self.schedule()
+    return [ f"Submitted batch job {jobid}" ]
+  def add(self,id,job):
+    self.jobs[id] = job; self.pending.append(id)
+  def running(self):
+    return [ id for id,j in self.jobs.items() if j["state"]=="RUNNING" ]
+  def schedule(self):
+    ## reap finished processes, stop those over time, start pending ones in free workers
+    now = time.time()
+    for id in self.running():
+      job = self.jobs[id]; status = job["process"].poll()
+      if status is None and job["limit"] and now-job["start"]>job["limit"]:
+        os.killpg( job["process"].pid,signal.SIGKILL )
+        status = job["process"].wait(); job["state"] = "TIMEOUT"
+      if status is not None:
+        job["end"] = now; job["exitcode"] = f"{max(status,0)}:{max(-status,0)}"
+        job["output_handle"].close()
+        if job["state"]=="RUNNING":
+          job["state"] = "COMPLETED" if status==0 else "FAILED"
+    running = self.running()
+    for id in list(self.pending):
+      if self.workers is not None and len(running)>=self.workers: break
+      job = self.jobs[id]
+      if job["throttle"] and len( [ r for r in running
+                                    if self.jobs[r]["arrayid"]==job["arrayid"] ] )>=job["throttle"]:
+        continue
+      self.start(id,job); running.append(id); self.pending.remove(id)
+  def start(self,id,job):
+    jobid = job["arrayid"] or id
+    environment = dict( os.environ,
+                        PATH=f"{self.bindir}:{os.environ.get('PATH','')}",
+                        SLURM_JOB_ID=jobid,SLURM_JOBID=jobid,SLURM_JOB_NAME=job["name"],
+                        SLURM_JOB_PARTITION=job["partition"],SLURM_SUBMIT_DIR=os.getcwd(),
+                        SLURM_NNODES=str(job["nodes"]),SLURM_JOB_NUM_NODES=str(job["nodes"]),
+                        SLURM_NTASKS=str(job["nodes"]*job["ppn"]),
+                        SLURM_TASKS_PER_NODE=str(job["ppn"]),
+                        SLURM_CPUS_ON_NODE=str(os.cpu_count()),
+                        SLURM_PROCID="0",SLURM_LOCALID="0",SLURM_NODEID="0",
+                        SLURMD_NODENAME=os.uname().nodename )
+    output = job["output"].replace("%j",jobid)
+    if job["index"] is not None:
+      environment.update( SLURM_ARRAY_JOB_ID=jobid,SLURM_ARRAY_TASK_ID=str(job["index"]) )
+      output = output.replace("%a",str(job["index"])).replace("%A",jobid)
+    job["output_handle"] = open(output,"w")
+    job["process"] = sp.Popen( ["bash",job["script"]],stdout=job["output_handle"],stderr=sp.STDOUT,
+                               env=environment,start_new_session=True )
+    job["start"] = time.time(); job["state"] = "RUNNING"
+  def squeue(self,user,format):
+    with self.lock:
+      self.schedule()
+      lines = []
+      for id,job in self.jobs.items():
+        if job["state"] not in [ "PENDING","RUNNING" ]: continue
+        state = "PD" if job["state"]=="PENDING" else "R"
+        if job["limit"] and job["start"]:
+          left = max( int( job["limit"]-(time.time()-job["start"]) ),0 )
+          left = f"{left//3600}:{left//60%60:02}:{left%60:02}"
+        else: left = "UNLIMITED"
+        lines.append( format.replace("%i",id).replace("%t",state).replace("%P",job["partition"])
+                      .replace("%S","N/A").replace("%L",left) )
+      return lines
+  def sacct(self,jobids,fields):
+    def timestamp(t):
+      return time.strftime( "%Y-%m-%dT%H:%M:%S",time.localtime(t) ) if t else "Unknown"
+    with self.lock:
+      self.schedule()
+      lines = []
+      for id,job in self.jobs.items():
+        if id not in jobids and job["arrayid"] not in jobids: continue
+        values = { "JobID":id,"Submit":timestamp(job["submit"]),"Start":timestamp(job["start"]),
+                   "End":timestamp(job["end"]),"ExitCode":job["exitcode"] or "0:0",
+                   "NNodes":str(job["nodes"]),"ConsumedEnergyRaw":"","State":job["state"],
+                   "Partition":job["partition"] }
+        lines.append( "|".join( [ values.get(f,"") for f in fields ] ) )
+      return lines
+  def shutdown(self):
+    ## nothing outlives demonspawn
+    for id in self.running():
+      try: os.killpg( self.jobs[id]["process"].pid,signal.SIGKILL )
+      except ProcessLookupError: pass
+    shutil.rmtree(self.bindir,ignore_errors=True)
+  def __str__(self):
+    return f"local, {self.workers} workers" if self.workers else "local, queue limits"
+
+def make_backend(spec):
+  ## `slurm' or `local [workers:8]'
+  words = spec.split()
+  if words[0]=="slurm":
+    return SlurmBackend()
+  elif words[0]=="local":
+    workers = None
+    for w in words[1:]:
+      if re.match("workers:",w): workers = w.split(":",1)[1]
+      else: raise Exception(f"Unknown local backend option: <<{w}>>")
+    return LocalBackend(workers)
+  else:
+    raise Exception(f"Unknown backend <<{words[0]}>>, use slurm or local")
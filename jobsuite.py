@@ -12,16 +12,37 @@
 # jobsuite.py : classes for suites and jobs
 #
 
+import asyncio
+import collections
+import concurrent.futures
 import copy
 import datetime
-from functools import reduce
+import fnmatch
+import hashlib
+from functools import lru_cache, reduce
 import io
+import itertools
+import json
+import math
+import mmap
 import os
+import random
 import re
+import shutil
+import statistics
 import sys
-import subprocess as sp
+import threading
 import time
 
+from backends import SlurmBackend, SlurmCallFailed, make_backend, slurm_seconds
+from journal import Journal
+from plan import suite_plan, plan_summary
+from profiling import profile_options, wrapper_script, profile_spec, collect_profile, \
+  profile_line, parse_profile_line, profile_violations
+from results import ResultsStore
+from scaling import scaling_options, scaling_analysis, scaling_table, scaling_summary
+from sweep import ParameterSpace
+from timeline import sacct_fields, parse_sacct, add_intervals, campaign_metrics, timeline_table, timeline_summary
 
 def DefaultModules():
   return "intel/18.0.2"
@@ -43,36 +64,115 @@ def macro_value( m,macros ):
     else:
         return m
 
+@lru_cache(maxsize=4096)
+def compile_template(text):
+    #
+    # split a string into literal text and macro references:
+    # a string is literal, a tuple is the compiled name of a macro,
+    # so that `%[a%[b]]' gives ( ( "a",( "b", ) ), )
+    #
+    tokens = []; literal = ""; i = 0
+    while i<len(text):
+        start = text.find("%[",i)
+        if start<0:
+            literal += text[i:]; break
+        literal += text[i:start]
+        ## find the matching bracket, allowing nested macros in the name
+        depth = 1; j = start+2
+        while j<len(text) and depth>0:
+            if text.startswith("%[",j):
+                depth += 1; j += 2
+            elif text[j]=="]":
+                depth -= 1; j += 1
+            else: j += 1
+        if depth>0:
+            ## unterminated: keep as text
+            literal += text[start:]; break
+        if len(literal)>0:
+            tokens.append(literal); literal = ""
+        tokens.append( compile_template( text[start+2:j-1] ) )
+        i = j
+    if len(literal)>0:
+        tokens.append(literal)
+    return tuple(tokens)
+
+class MacroScope():
+    #
+    # macro values are looked up in the given dictionaries, then the environment;
+    # a value can contain macros itself. Expanded values are memoized
+    # for the lifetime of the scope, so make a new scope when the macros change.
+    #
+    def __init__(self,*layers):
+        self.layers = list(layers)+[ os.environ ]
+        self.memo = {}
+    def value(self,name,active=()):
+        if name in self.memo:
+            return self.memo[name]
+        if name in active:
+            cycle = " -> ".join( list(active)+[name] )
+            raise Exception(f"Macro cycle: {cycle}")
+        for layer in self.layers:
+            if name in layer:
+                value = str( layer[name] ); break
+        else:
+            ## unknown macros stand for themselves
+            value = name
+        if "%[" in value:
+            value = self.resolve( compile_template(value),active+(name,) )
+        self.memo[name] = value
+        return value
+    def resolve(self,tokens,active=()):
+        pieces = []
+        for t in tokens:
+            if isinstance(t,str):
+                pieces.append(t)
+            else:
+                pieces.append( self.value( self.resolve(t,active),active ) )
+        return "".join(pieces)
+    def expand(self,text):
+        if "%[" not in text: return text
+        return self.resolve( compile_template(text) )
+
 def macros_substitute(line,macros):
-    print(f"macro substitution in <<{line}>>")
-    subline = line
-    while True:
-        if m_match := re.search(r'\%\[([^[]+)\]',subline):
-            macro = m_match.groups()[0]
-            print(f".. found macro <<{macro}>>")
-            value = macro_value(macro,macros)
-            subline = re.sub(r'\%\['+macro+r'\]',value,subline)
-            print(f".. giving <<{subline}>>")
-        else: break
-    # for m in macros.keys():
-    #     m_search = r'\%\[{}\]'.format(m)
-    #     if re.search(m_search,line):
-    #         replacement_text = macro_value( m,macros )
-    #         if m=="modules":
-    #             replacement_text = module_string(replacement_text)
-    #         subline = re.sub( m_search, replacement_text, subline )
-    return subline
+    return MacroScope(macros).expand(line)
+
+##
+## a file in the SpawnFiles pool:
+## writes go to the underlying handle, which is reopened if it was evicted
+##
+class PooledFile():
+  def __init__(self,pool,key):
+    self.pool = pool; self.key = key
+  @property
+  def name(self):
+    return self.pool.file_names[self.key]
+  def write(self,text):
+    with self.pool.lock:
+      return self.pool.handle(self.key).write(text)
+  def flush(self):
+    with self.pool.lock:
+      if h := self.pool.handles.get(self.key,None):
+        h.flush()
+  def close(self):
+    ## give up the handle, but keep the file registered
+    self.pool.release(self.key)
 
 ##
 ## files may not be unique per job
-## so we need central bookkeeping
+## so we need central bookkeeping;
+## only a limited number of files is kept open, least recently used ones are closed
 ## this is a singleton class
 ##
 class SpawnFiles():
   instance = None
   class __spawnfiles():
     def __init__(self):
-      self.file_handles = {}; self.file_names = {}
+      ## file_names: key -> path for all files, handles: the ones currently open
+      self.file_names = {}; self.paths = {}; self.wrappers = {}
+      self.handles = collections.OrderedDict()
+      self.max_handles = 64
+      self.stats = { "opens":0,"reopens":0,"evictions":0,"peak":0 }
+      self.lock = threading.RLock()
       self.outputdir = None
       self.debug = False
     def debug_print(self,msg):
@@ -80,6 +180,11 @@ class SpawnFiles():
         print(msg)
         if logfile := self.get_by_key("logfile"):
           logfile.write(msg+"\n")
+    def set_max_handles(self,n):
+      with self.lock:
+        self.max_handles = max( int(n),1 )
+        while len(self.handles)>self.max_handles:
+          self.evict()
     def setoutputdir(self,dir):
       if not os.path.exists(dir):
         self.debug_print(f"Creating output directory <<{dir}>>")
@@ -102,43 +207,74 @@ class SpawnFiles():
         self.debug_print(f"Directory <<{filedir}>> already exists")
         pass
       return filedir
-    def open(self,fil,key=None,dir=None,subdir=None,new=False):
+    def evict(self):
+      ## close the least recently used handle
+      key,h = self.handles.popitem(last=False)
+      h.close()
+      self.stats["evictions"] += 1
+    def handle(self,key,mode="a",reopen=True):
+      ## open handle for a registered file, most recently used goes last;
+      ## an evicted file is reopened for appending
+      if key in self.handles:
+        self.handles.move_to_end(key)
+        return self.handles[key]
+      while len(self.handles)>=self.max_handles:
+        self.evict()
+      h = open(self.file_names[key],mode)
+      self.handles[key] = h
+      self.stats["reopens" if reopen else "opens"] += 1
+      self.stats["peak"] = max( self.stats["peak"],len(self.handles) )
+      return h
+    def open(self,fil,key=None,dir=None,subdir=None,new=False,append=False):
       ### return handle, dirname, filename, key
       filedir = self.ensurefiledir(dir,subdir)
       filename = fil
       if not key: key = filename
       self.debug_print(f"Opening dir={filedir} file={filename} key={key}")
       fullname = f"{filedir}/{filename}"
-      if key not in self.file_handles.keys():
-        h = open(fullname,"w")
-        self.file_handles[key] = h; self.file_names[key] = fullname
-        return h,filedir,filename,key
-      elif new:
-        raise Exception(f"Key <<{key}>> File <<{fullname}>> already exists")
-      else:
-        return self.file_handles[key],filedir,filename,key
-    def open_new(self,fil,key=None,dir=None,subdir=None):
+      with self.lock:
+        if key not in self.file_names:
+          self.file_names[key] = fullname; self.paths[fullname] = key
+          self.wrappers[key] = PooledFile(self,key)
+          self.handle(key,"a" if append else "w",reopen=False)
+          return self.wrappers[key],filedir,filename,key
+        elif new:
+          raise Exception(f"Key <<{key}>> File <<{fullname}>> already exists")
+        else:
+          return self.wrappers[key],filedir,filename,key
+    def open_new(self,fil,key=None,dir=None,subdir=None,append=False):
       self.debug_print(f"Open new <{fil}>> at <<{dir}/{subdir}>>")
-      return self.open(fil,key=key,dir=dir,subdir=subdir,new=True)
+      return self.open(fil,key=key,dir=dir,subdir=subdir,new=True,append=append)
     def get(self,id):
-      return self.file_handles[id]
+      return self.wrappers[id]
+    def get_by_key(self,key):
+      return self.wrappers.get(key,None)
+    def release(self,key):
+      with self.lock:
+        if h := self.handles.pop(key,None):
+          h.close()
     def close_by_path(self,path):
-      for fk in self.file_names.keys():
-        if self.file_names[fk]==path:
-          self.file_handles[fk].close()
+      if ( key := self.paths.get(path,None) ) is not None:
+        self.release(key)
     def close_files(self,keys):
+      with self.lock:
         for k in keys:
-            if k is None or k not in self.file_handles.keys():
-                self.debug_print(f"Suspicious attempt to close {k}")
-            else:
-                self.debug_print(f"closing job: {k} => {self.file_names[k]}")
-                self.file_handles[k].close()
-            self.file_handles.pop(k,None)
-            self.file_names.pop(k,None)
+          if k is None or k not in self.file_names:
+            self.debug_print(f"Suspicious attempt to close {k}")
+          else:
+            self.debug_print(f"closing job: {k} => {self.file_names[k]}")
+            self.release(k)
+            self.paths.pop(self.file_names[k],None)
+          self.file_names.pop(k,None)
+          self.wrappers.pop(k,None)
+    def __str__(self):
+      return f"File handles: opens={self.stats['opens']} reopens={self.stats['reopens']}" \
+        +f" evictions={self.stats['evictions']} peak={self.stats['peak']}" \
+        +f" open={len(self.handles)} limit={self.max_handles}"
     def __del__(self):
-      for f in self.file_handles.keys():
+      for f in list( self.handles.keys() ):
         self.debug_print(f"closing file: {f}")
-        self.file_handles[f].close()
+        self.release(f)
   def __new__(cls):
     if not SpawnFiles.instance:
       SpawnFiles.instance = SpawnFiles.__spawnfiles()
@@ -146,27 +282,420 @@ class SpawnFiles():
   def __getattr__(self,attr):
     return self.instance.__getattr__(attr)
 
+@lru_cache(maxsize=None)
 def regression_test_dict(regression):
     ## split `regression' clause, return dict
+    ## this is cached, so patterns are compiled once per regression clause
     rtest = {}
     for kv in regression.split():
         if not re.search(":",kv):
             print(f"ill-formed regression clause <<{kv}>>")
             continue
-        k,v = kv.split(":")
+        k,v = kv.split(":",1)
         if k=="label":
             if k not in rtest.keys():
                 rtest[k] = []
             rtest[k].append(v)
         else:
             rtest[k] = v
+    if "grep" in rtest.keys():
+        rtest["greptext"] = re.sub("_"," ",rtest["grep"])
+        rtest["pattern"] = re.compile( rtest["greptext"] )
+    if p := re.match(r'^p([0-9.]+)$',rtest.get("take","first")):
+        try: valid = 0<=float(p.groups()[0])<=100
+        except ValueError: valid = False
+        if not valid:
+            raise Exception(f"Regression take option <<{rtest['take']}>> needs a percentile from 0 to 100")
+    ## lines that are never regressed on; by default the TACC job epilog
+    skip = rtest.get("skip","^TACC")
+    rtest["skippattern"] = None if skip in ["none","None"] else re.compile( re.sub("_"," ",skip) )
     return rtest
 
+##
+## extraction of the regression line from an output file
+## everything is streamed or read from the end, so memory use is bounded
+##
+MMAP_THRESHOLD = 64*1024*1024
+
+def line_selector(rtest):
+    #
+    # return (kind,n,skip): "grep", "first" / "number" n (1-based), "last" n from the end;
+    # lines matching `skip' are not counted
+    #
+    skip = rtest.get("skippattern",None)
+    if "grep" in rtest.keys():
+        return "grep",1,skip
+    what_line = rtest["line"]
+    if what_line=="first":
+        return "number",1,skip
+    elif what_line=="last":
+        return "last",1,skip
+    elif re.match(r'^-[0-9]+$',what_line):
+        return "last",-int(what_line),skip
+    elif re.match(r'^[0-9]+$',what_line):
+        return "number",int(what_line),skip
+    else:
+        raise Exception(f"Unknown regression line specification: <<{what_line}>>")
+
+def kept_lines(lines,skip):
+    ## the lines that do not match the skip pattern
+    if skip is None: return lines
+    return ( line for line in lines if not skip.match(line) )
+
+def scan_lines(lines,rtest):
+    ## single pass over an iterable of lines, return the regression line or None
+    kind,n,skip = line_selector(rtest)
+    lines = kept_lines(lines,skip)
+    if kind=="grep":
+        pattern = rtest["pattern"]
+        for line in lines:
+            if pattern.search(line):
+                return line.strip()
+        return None
+    elif kind=="number":
+        for count,line in enumerate(lines):
+            if count+1==n:
+                return line.strip()
+        return None
+    else:
+        tail = collections.deque(lines,maxlen=n)
+        if len(tail)<n: return None
+        return tail[0].strip()
+
+def has_extractor(rtest):
+    return "line" in rtest.keys() or "grep" in rtest.keys() or "table" in rtest.keys()
+
+##
+## tables, such as the message size / latency output of the OSU benchmarks:
+## a header line followed by a block of lines that are all numbers
+##
+def numeric_row(line):
+    ## list of floats if the line is all numbers, else None
+    fields = line.split()
+    if len(fields)==0: return None
+    try:
+        return [ float(f) for f in fields ]
+    except ValueError:
+        return None
+
+def table_columns(header):
+    ## column names from a header line; names are separated by at least two spaces
+    return [ c for c in re.split(r'\s{2,}',re.sub(r'^#\s*','',header.strip())) if c!="" ]
+
+def scan_table(lines,rtest):
+    ## single pass, keeping only the current block: return dict with header and rows
+    which = rtest.get("table","last")
+    nth = int(which) if re.match(r'^[0-9]+$',which) else None
+    header = None; rows = []; found = None; count = 0
+    def complete():
+        nonlocal count
+        count += 1
+        return { "header":header,"rows":rows }
+    for line in kept_lines( lines,rtest.get("skippattern",None) ):
+        row = numeric_row(line)
+        if row is not None and ( len(rows)==0 or len(row)==len(rows[0]) ):
+            rows.append(row); continue
+        if len(rows)>0:
+            found = complete()
+            if which=="first" or count==nth: return found
+            rows = []
+            if row is not None: # different column count starts a new table
+                rows.append(row); continue
+        if line.strip()!="": header = line
+    if len(rows)>0:
+        found = complete()
+    if nth is not None and count!=nth: return None
+    return found
+
+def table_column(table,rtest):
+    ## index of the regression column: field number or header name, default the last
+    field = rtest.get("field",None); ncolumns = len(table["rows"][0])
+    if field is None:
+        return ncolumns-1
+    elif re.match(r'^[0-9]+$',field):
+        return int(field)-1
+    columns = table_columns(table["header"]) if table["header"] else []
+    name = re.sub("_"," ",field).lower()
+    for icol,c in enumerate(columns):
+        if c.lower().startswith(name): return icol
+    raise Exception(f"No table column <<{field}>> in <<{columns}>>")
+
+##
+## multiple samples: with `take' every matching line contributes a sample,
+## and the samples are reduced to a single value
+##
+def takes_samples(rtest):
+    return "grep" in rtest.keys() and rtest.get("take","first")!="first"
+
+def sample_value(line,rtest):
+    ## numeric value of the regression field in this line, or None
+    if "field" in rtest.keys():
+        fields = line.split()
+        try:
+            line = fields[ int(rtest["field"])-1 ]
+        except IndexError:
+            return None
+    try:
+        return float(line)
+    except ValueError:
+        return None
+
+def scan_samples(lines,rtest):
+    ## single pass over an iterable of lines, return all sample values
+    pattern = rtest["pattern"]; samples = []
+    for line in kept_lines( lines,rtest.get("skippattern",None) ):
+        if pattern.search(line):
+            if ( v := sample_value(line,rtest) ) is not None:
+                samples.append(v)
+    return samples
+
+def percentile(ordered,p):
+    ## p-th percentile of sorted values, linear interpolation
+    if len(ordered)==1: return ordered[0]
+    position = (len(ordered)-1)*p/100.
+    lo = math.floor(position); hi = math.ceil(position)
+    return ordered[lo]+(ordered[hi]-ordered[lo])*(position-lo)
+
+def reduce_samples(samples,rtest):
+    ## return reduced value and standard deviation (None for a single sample)
+    take = rtest.get("take","first")
+    if take=="first": return samples[0],None
+    if take=="last":  return samples[-1],None
+    ordered = sorted(samples)
+    if trim := rtest.get("trim",None):
+        ## drop outliers: trim:10 removes the lowest and highest 10 percent
+        ntrim = int( len(ordered)*float(re.sub("p.*","",trim))/100. )
+        if 2*ntrim<len(ordered):
+            ordered = ordered[ntrim:len(ordered)-ntrim]
+    stddev = statistics.stdev(ordered) if len(ordered)>1 else None
+    if take in [ "avg","mean" ]:
+        value = statistics.fmean(ordered)
+    elif take=="min":
+        value = ordered[0]
+    elif take=="max":
+        value = ordered[-1]
+    elif take=="median":
+        value = statistics.median(ordered)
+    elif take=="stddev":
+        value = stddev if stddev is not None else 0.
+    elif p := re.match(r'^p([0-9.]+)$',take):
+        value = percentile(ordered,float(p.groups()[0]))
+    else:
+        raise Exception(f"Unknown regression take option: <<{take}>>")
+    return value,stddev
+
+def tail_lines(filename,n,skip=None,blocksize=65536):
+    ## last n lines of a file that do not match `skip', reading backward from the end;
+    ## every block is decoded once, its partial first line is carried over to the next block
+    with open(filename,"rb") as f:
+        f.seek(0,os.SEEK_END); position = f.tell()
+        partial = b""; newline = b""; blocks = []; nkept = 0
+        while position>0 and nkept<n:
+            read = min(blocksize,position); position -= read
+            f.seek(position)
+            data = f.read(read)+partial
+            if position>0:
+                cut = data.find(b"\n")
+                if cut<0:
+                    partial = data; continue
+                partial,data = data[:cut],data[cut+1:]
+            ## the complete lines, ending in the newline that was cut off the previous block
+            lines = list( kept_lines( (data+newline).decode("utf-8",errors="replace").splitlines(),skip ) )
+            blocks.append(lines); nkept += len(lines); newline = b"\n"
+    lines = [ line for block in reversed(blocks) for line in block ]
+    return lines[-n:] if n>0 else []
+
+def mmap_grep(filename,rtest):
+    ## first line matching the grep pattern, searched in a memory map
+    with open(filename,"rb") as f:
+        with mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as m:
+            skip = rtest.get("skippattern",None)
+            for match in re.finditer( rtest["greptext"].encode("utf-8"),m ):
+                start = m.rfind(b"\n",0,match.start())+1
+                end = m.find(b"\n",match.end())
+                if end<0: end = len(m)
+                line = m[start:end].decode("utf-8",errors="replace")
+                if skip is None or not skip.match(line):
+                    return line.strip()
+            return None
+
+def mmap_samples(filename,rtest):
+    ## all sample values, from lines found in a memory map
+    with open(filename,"rb") as f:
+        with mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as m:
+            samples = []; skip = rtest.get("skippattern",None)
+            for match in re.finditer( rtest["greptext"].encode("utf-8"),m ):
+                start = m.rfind(b"\n",0,match.start())+1
+                end = m.find(b"\n",match.end())
+                if end<0: end = len(m)
+                line = m[start:end].decode("utf-8",errors="replace")
+                if skip is not None and skip.match(line): continue
+                if ( v := sample_value(line,rtest) ) is not None:
+                    samples.append(v)
+            return samples
+
+def scan_regression(lines,rtest):
+    ## single pass: the regression line, the list of samples, or a table
+    if "table" in rtest.keys():
+        return scan_table(lines,rtest)
+    elif takes_samples(rtest):
+        return scan_samples(lines,rtest)
+    else: return scan_lines(lines,rtest)
+
+def extract_regression(filename,rtest):
+    ## the regression line, the list of samples, or a table, from an output file
+    if "table" in rtest.keys():
+        with open(filename,"r",errors="replace") as output_file:
+            return scan_table(output_file,rtest)
+    elif takes_samples(rtest):
+        if os.path.getsize(filename)>MMAP_THRESHOLD:
+            return mmap_samples(filename,rtest)
+        with open(filename,"r",errors="replace") as output_file:
+            return scan_samples(output_file,rtest)
+    else: return extract_line(filename,rtest)
+
+def extract_line(filename,rtest):
+    ## regression line from an output file, picking the fastest access method
+    kind,n,skip = line_selector(rtest)
+    if kind=="last":
+        tail = tail_lines(filename,n,skip)
+        if len(tail)<n: return None
+        return tail[0].strip()
+    if kind=="grep" and os.path.getsize(filename)>MMAP_THRESHOLD:
+        return mmap_grep(filename,rtest)
+    with open(filename,"r",errors="replace") as output_file:
+        return scan_lines(output_file,rtest)
+
+def regression_worker(task):
+    ## extract the regression line of one output file; runs in a pool process
+    filename,regression = task
+    rtest = regression_test_dict(regression)
+    if not has_extractor(rtest):
+        return None,0,None
+    try:
+        return extract_regression(filename,rtest),os.path.getsize(filename),None
+    except FileNotFoundError as e:
+        return None,0,str(e)
+
+def filter_output(filename,remove,rtest=None):
+    ## remove lines matching `remove' from the output file,
+    ## and extract the regression line or samples in the same pass
+    pattern = re.compile(remove); tmpname = f"{filename}.filtering"
+    def kept_lines(output_file,filtered_file):
+        for line in output_file:
+            if not pattern.search(line):
+                filtered_file.write(line)
+                yield line
+    with open(filename,"r",errors="replace") as output_file:
+        with open(tmpname,"w") as filtered_file:
+            lines = kept_lines(output_file,filtered_file)
+            line = scan_regression(lines,rtest) if rtest else None
+            ## the scan may stop early: copy the rest
+            for _ in lines: pass
+    os.replace(tmpname,filename)
+    return line
+
+def file_digest(path):
+  ## content hash of a file, computed once for every version of the file
+  try:
+    st = os.stat(path)
+  except FileNotFoundError:
+    return "missing"
+  return content_digest(path,st.st_mtime_ns,st.st_size)
+
+@lru_cache(maxsize=None)
+def content_digest(path,mtime,size):
+  h = hashlib.sha256()
+  with open(path,"rb") as f:
+    for block in iter( lambda:f.read(1<<20),b"" ):
+      h.update(block)
+  return h.hexdigest()
+
+def link_file(source,target):
+  ## hard link if possible, otherwise copy; the target is only replaced once the new file exists
+  if os.path.abspath(source)==os.path.abspath(target) \
+     or ( os.path.exists(target) and os.path.samefile(source,target) ):
+    return
+  temporary = f"{target}.{os.getpid()}.tmp"
+  try:
+    os.link(source,temporary)
+  except OSError:
+    shutil.copy2(source,temporary)
+  os.replace(temporary,target)
+
+def modules_spec(modules):
+  if modules!="default":
+    return f"""## custom modules
+module reset
+module load {modules}
+"""
+  else: return ""
+
+def env_spec(environment):
+  if len(environment)==0:
+    return ""
+  return "## swept environment variables\n" \
+    +"".join( [ f"export {name}={value}\n" for name,value in environment.items() ] )
+
+def thread_spec(threads):
+  if threads==0:
+    return ""
+  if threads>0:
+    threadcount = threads
+  else:
+    threadcount = "$(( SLURM_CPUS_ON_NODE / SLURM_NTASKS * SLURM_NNODES ))"
+  return f"""## OpenMP thread specification
+threadcount={threadcount}
+if [ $threadcount -lt 1 ] ; then threadcount=1 ; fi
+export OMP_NUM_THREADS=$threadcount
+export OMP_PROC_BIND=true
+"""
+
+@lru_cache(maxsize=None)
+def profile_wrapper_file(per):
+  ## the profiling wrapper is written once per output directory
+  path = os.path.abspath( f"{SpawnFiles().ensurefiledir(subdir='scripts')}/profile-{per}.sh" )
+  with open(path,"w") as wrapper:
+    wrapper.write( wrapper_script(per) )
+  os.chmod(path,0o755)
+  return path
+
+def profiler(options):
+  ## launch prefix that runs each rank under the profiling wrapper
+  return f"{profile_wrapper_file(options['per'])} " if options else ""
+
+@lru_cache(maxsize=64)
+def batch_script_template(sbatch):
+  ## job script with macros for everything that differs between jobs;
+  ## sbatch is the tuple of extra options, so this is compiled once per suite
+  extra = "".join( [ f"#SBATCH {s}\n" for s in sbatch ] )
+  return compile_template(
+f"""#!/bin/bash
+#SBATCH -J %[unique_name]
+#SBATCH -o %[output]
+#SBATCH -e %[output]
+#SBATCH -p %[queue]
+#SBATCH -t %[time]
+#SBATCH -N %[nodes]
+#SBATCH --tasks-per-node %[ppn]
+#SBATCH -A %[account]
+{extra}
+
+%[module_spec]%[env_spec]%[thread_spec]%[profile_spec]
+cd %[outputdir]
+program=%[programdir]/%[program_name]
+if [ ! -f "$program" ] ; then 
+  echo "Program does not exist: $program"
+  exit 1
+fi
+%[runner]%[profiler]$program%[program_args]
+""")
+
 class Job():
     def __init__(self,configuration,**kwargs):
 
         self.configuration = configuration
-        for key in [ "account", "queue", "sbatch", "user", "time", ]:
+        for key in [ "account", "queue", "sbatch", "user", ]:
             try :
                 self.__dict__[key] = self.configuration[key]
             except KeyError:
@@ -177,11 +706,21 @@ class Job():
         self.nodes = 1; self.cores = 10; self.ppn = 1; self.threads = 0
         self.unique_name = None
 
-        self.time = "01:00:00"
+        self.time = self.configuration.get("time","01:00:00")
         self.runner = "./"
+        self.environment = {}; self.args = None; self.variant = ""
         self.trace = False; self.debug = False
         self.logfile,_,_,_ = SpawnFiles().open("logfile")
         self.macros = copy.copy( kwargs.pop("macros",{}) )
+        self.result = None
+        self.array = kwargs.pop("array",None); self.array_index = None
+        self.repetitions = kwargs.pop("repetitions",None)
+        self.cache_key = None; self.reused = False
+        self.profiling = profile_options( self.configuration.get("profile","none") )
+        self.profile = None
+        if self.profiling: SpawnFiles().ensurefiledir(subdir="profile")
+        ## local submit/start/end times, in case there is no accounting
+        self.times = { "submit":None,"start":None,"end":None }; self.timeline = None
         self.set_has_not_been_submitted()
 
         tracestring = ""
@@ -198,19 +737,25 @@ class Job():
         if not self.unique_name: raise Exception(f"Missing key: unique_name")
         tracestring = f"Creating job <<{self.unique_name}>> with <<{tracestring}>>"
 
-        script_file_name = f"{self.unique_name}.script"
-        script_file_handle,scriptdir,script_file_name,_ \
-          = SpawnFiles().open_new( script_file_name,subdir="scripts" )
-        self.script_file_name = f"{scriptdir}/{script_file_name}"
         self.slurm_output_file_name = f"{self.outputdir}/{self.unique_name}.out"
-        script_file_handle.write(self.script_contents()+"\n")
-        script_file_handle.close()
+        if self.array:
+            ## array elements share the script of the array
+            self.array.add(self)
+            self.script_file_name = self.array.script_file_name
+        else:
+            script_file_name = f"{self.unique_name}.script"
+            script_file_handle,scriptdir,script_file_name,script_key \
+              = SpawnFiles().open_new( script_file_name,subdir="scripts" )
+            self.script_file_name = f"{scriptdir}/{script_file_name}"
+            script_file_handle.write(self.script_contents()+"\n")
+            ## written once: nothing of it stays in the pool
+            SpawnFiles().close_files( [script_key] )
         self.logfile.write(f"""
 %%%%%%%%%%%%%%%%
 {self.count:3}: script={self.script_file_name}
  logout={self.slurm_output_file_name}
 """)
-        if self.trace:
+        if self.trace and not self.array:
             print(f"Written job file <<{self.script_file_name}>> for <<{self.unique_name}>>")
         if self.regression and not self.global_regression_handle:
             raise Exception("Trying to create regression job without global regressionfile")
@@ -220,55 +765,26 @@ class Job():
         if self.logfile:
             self.logfile.write(msg+"\n")
     def modules_load_line(self):
-        if self.modules!="default":
-          return f"""## custom modules
-module reset
-module load {self.modules}
-"""
-        else: return ""
+        return modules_spec(self.modules)
     def omp_thread_spec(self):
-        if self.threads==0:
-          return ""
-        else:
-          if self.threads>0:
-            threadcount = self.threads
-          else:
-            threadcount = "$(( SLURM_CPUS_ON_NODE / SLURM_NTASKS * SLURM_NNODES ))"
-          return f"""## OpenMP thread specification
-threadcount={threadcount}
-if [ $threadcount -lt 1 ] ; then threadcount=1 ; fi
-export OMP_NUM_THREADS=$threadcount
-export OMP_PROC_BIND=true
-"""
+        return thread_spec(self.threads)
+    def script_macros(self):
+        return { "unique_name":self.unique_name,"output":self.slurm_output_file_name,
+                 "queue":self.queue,"time":self.time,"account":self.account,
+                 "nodes":self.nodes,"ppn":self.ppn,
+                 "module_spec":self.modules_load_line(),"thread_spec":self.omp_thread_spec(),
+                 "env_spec":env_spec(self.environment),
+                 "profile_spec":profile_spec(self.profiling,self.profile_base()),
+                 "profiler":profiler(self.profiling),
+                 "program_args":f" {self.args}" if self.args else "",
+                 "outputdir":self.outputdir,"programdir":self.programdir,
+                 "program_name":self.program_name,"runner":self.runner }
+    def profile_base(self):
+        ## the ranks write their profiles to <base>.<rank>
+        return os.path.abspath( f"{SpawnFiles().outputdir}/profile/{self.unique_name}" )
     def script_contents(self):
-        bench_program = self.runner+self.programdir+"/"+self.unique_name
-        module_spec = self.modules_load_line()
-        thread_spec = self.omp_thread_spec()
-        sbatch = ""
-        for s in self.sbatch:
-          sbatch += f"""#SBATCH {s}
-"""
-        return  \
-f"""#!/bin/bash
-#SBATCH -J {self.unique_name}
-#SBATCH -o {self.slurm_output_file_name}
-#SBATCH -e {self.slurm_output_file_name}
-#SBATCH -p {self.queue}
-#SBATCH -t {self.time}
-#SBATCH -N {self.nodes}
-#SBATCH --tasks-per-node {self.ppn}
-#SBATCH -A {self.account}
-{sbatch}
-
-{module_spec}{thread_spec}
-cd {self.outputdir}
-program={self.programdir}/{self.program_name}
-if [ ! -f "$program" ] ; then 
-  echo "Program does not exist: $program"
-  exit 1
-fi
-{self.runner}$program
-"""
+        template = batch_script_template( tuple(self.sbatch) )
+        return MacroScope( self.script_macros() ).resolve(template)
     def nodespec(self):
         if self.threads>0:
           thread_spec = f"-t{self.threads}"
@@ -280,11 +796,12 @@ fi
     def __str__(self):
         return f"{self.unique_name} N={self.nodes} cores={self.cores} threads={self.threads} regression={self.regression}"
     def submit(self):
+        if self.array:
+            return self.array.submit()
         if self.trace:
             print(f"sbatch: {self.script_file_name}")
-        p = sp.Popen(["sbatch",self.script_file_name],stdout=sp.PIPE)
         submitted = False
-        for line in io.TextIOWrapper(p.stdout, encoding="utf-8"):
+        for line in SlurmStatus().submit(self.script_file_name):
             line = line.strip()
             if False and ( self.trace or self.debug ):
                 print( line )
@@ -292,24 +809,95 @@ fi
             submitted = re.search("(Submitted.* )([0-9]+)",line)
             if submitted:
                 id = submitted.groups()[1]
+                ## registered before the id is visible to the status polling
+                SlurmStatus().register_submission(id,self.queue)
                 self.set_has_been_submitted(id)
                 return self.jobid
         if not submitted:
           raise Exception(f"Failure to submit <<{self.script_file_name}>>")
         return 0
+    def allocation(self):
+        ## nodes and hours of the slurm job that is created by submitting this job
+        if isinstance(self.array,JobPack):
+            return self.array.nodes,( slurm_seconds(self.array.time) or 0 )/3600
+        return int(self.nodes),( slurm_seconds(self.time) or 0 )/3600
+    def cost(self):
+        ## node-hours of everything that is submitted along with this job
+        if self.array and not isinstance(self.array,JobPack):
+            return sum( [ n*h for n,h in [ j.allocation() for j in self.array.jobs ] ] )
+        nodes,hours = self.allocation()
+        return nodes*hours
     def set_has_not_been_submitted(self):
-        self.jobid = "1"; self.status = "PRE"
+        self.jobid = "1"; self.status = "PRE"; self.processed = False
     def get_has_been_submitted(self):
         # meaning: submitted or running or finished
         return self.status!="PRE"
     def set_has_been_submitted(self,id):
-        self.status = "PD"; self.jobid = id
+        self.status = "PD"; self.jobid = id; self.times["submit"] = time.time()
         self.logfile.write(f"Status to pending, id={id}")
         if re.search("%j",self.slurm_output_file_name):
             self.slurm_output_file_name = re.sub("%j",self.jobid,self.slurm_output_file_name)
             self.logfile.write(f", output file name set to {self.slurm_output_file_name}")
         self.logfile.write("\n")
+        self.journal()
+    def journal(self,status=None):
+        ## record the current state, so that a run can be resumed
+        Journal().record( self.unique_name,status=status or self.status,jobid=self.jobid,
+                          output=self.slurm_output_file_name )
+    def restore(self,state):
+        #
+        # resume: take over the state of this job from the journal of an earlier run;
+        # return False if the job never made it to slurm
+        #
+        if state["status"]=="PRE" or state["jobid"] in [ None,"1" ]:
+            return False
+        self.jobid = state["jobid"]; self.slurm_output_file_name = state["output"]
+        if state["status"]=="DONE":
+            self.status = "POST"; self.processed = True
+            rfilename = f"{SpawnFiles().outputdir}/regression/{self.unique_name}.txt"
+            if self.regression and os.path.exists(rfilename):
+                result = read_regression_file(rfilename)
+                result["number"] = regression_number(result["value"])
+                self.result = result
+        else:
+            ## the next poll tells whether it is still pending or running, or finished
+            self.status = "PD"
+            SlurmStatus().register_submission(self.jobid,self.queue)
+        self.logwrite(f"Resumed job {self.unique_name} id={self.jobid} status={state['status']}")
+        return True
+    def content_key(self):
+        #
+        # hash of everything that determines the result of this job:
+        # the script without the output directory, the program binary, modules, environment, regression
+        #
+        script = self.script_contents().replace(SpawnFiles().outputdir,"%[outputdir]")
+        h = hashlib.sha256()
+        for part in [ script,file_digest(f"{self.programdir}/{self.program_name}"),
+                      str(self.modules),str(self.configuration.get("env",[])),
+                      str(self.environment),str(self.regression) ]:
+            h.update( part.encode() ); h.update( b"\0" )
+        return h.hexdigest()
+    def reuse(self,cached):
+        ## incremental: take over the result of an identical earlier job
+        if not os.path.exists(cached["regression_file"]):
+            return False
+        rfilename = f"{SpawnFiles().ensurefiledir(subdir='regression')}/{self.unique_name}.txt"
+        link_file(cached["regression_file"],rfilename)
+        if os.path.exists(cached["output_file"]):
+            link_file(cached["output_file"],self.slurm_output_file_name)
+        result = read_regression_file(rfilename)
+        result["number"] = regression_number(result["value"])
+        self.result = result
+        self.jobid = cached["jobid"] or "1"; self.status = "POST"; self.processed = True
+        self.reused = True
+        self.global_regression_handle.write\
+            (f"File: {self.unique_name} Result: {result['value']} samples: {int(result['samples'] or 0)}\n")
+        self.logwrite(f"Reusing result of {cached['unique_name']} for {self.unique_name}")
+        self.journal("DONE")
+        return True
     def status_update(self,status):
+        ## returns True if the job has just finished running
+        previous = self.status
         if status!="NS":
             # job was found in slurm, status is PD or R or CG
             self.status = status 
@@ -318,7 +906,14 @@ fi
             if self.jobid!="1":
                 # it has an actual id
                 if not self.done_running():
-                    self.set_done_running()
+                    self.status = "POST" # done running
+                    self.times["end"] = time.time()
+                    self.journal()
+                    return True
+        if self.status=="R" and self.times["start"] is None:
+            self.times["start"] = time.time()
+        if self.status!=previous: self.journal()
+        return False
     def is_running(self):
         return self.jobid!="1" and self.status=="R"
     def is_pending(self):
@@ -327,23 +922,33 @@ fi
         return self.status=="POST"
     def set_done_running(self):
         self.status = "POST" # done running
-        ## filter crud from output file
-        with open(self.slurm_output_file_name,"r") as slurm_out:
-            lines = slurm_out.readlines()
-        with open(self.slurm_output_file_name,"w") as slurm_out:
-            for line in lines:
-                if not re.match("TACC",line):
-                    slurm_out.write(line)
-        ## regression
-        if self.regression:
-            self.do_regression()
+        self.postprocess()
+    def postprocess(self):
+        try:
+            rtest = None
+            if self.regression and self.regression!="none":
+                rtest = regression_test_dict( self.regression )
+            extracted = None; scanned = False
+            ## optionally filter crud from output file, extracting the regression line
+            if remove := self.configuration.get("outputfilter",None):
+                try:
+                    extracted = filter_output(self.slurm_output_file_name,remove,rtest)
+                    scanned = rtest is not None
+                except FileNotFoundError as e:
+                    print(f"Could not open output file for filtering: <<{e}>>")
+            ## regression
+            if self.regression:
+                self.do_regression(extracted=extracted,scanned=scanned)
+            ## this may add another repetition of this configuration
+            if self.repetitions:
+                self.repetitions.done(self)
+        finally:
+            self.processed = True
+            self.journal("DONE")
     def get_status(self):
-        id = self.jobid
-        # squeue -j 6137988 -h -o "%t"
-        p = sp.Popen(["squeue","-j",id,"-h","-o","%t"],stdout=sp.PIPE)
-        status = "CD"
-        for status in io.TextIOWrapper(p.stdout, encoding="utf-8"):
-            status = status.strip()
+        ## status from the shared squeue cache; not found means completed
+        status = SlurmStatus().status(self.jobid,self.user)
+        if status=="NS": status = "CD"
         return status
     def regression_line_pick_field(self,line,rtest):
         if "field" in rtest.keys():
@@ -365,72 +970,524 @@ fi
                     labels = labels+" "+macro_value( l, self.macros )
             return f"{labels} {string}"
         else: return string
-    def regression_grep(self,output_file,rtest):
-        unique_name = self.unique_name
-        greptext = re.sub("_"," ",rtest["grep"])
-        found = False; rkey = None
-        for line in output_file:
-            line = line.strip()
-            if re.search(greptext,line):
-                found = True
-                string = self.regression_line_pick_field(line,rtest)
-                string = self.regression_label_prepend(string,rtest)
-                self.logfile.write(f"File: {self.unique_name}\n{string}\n")
-                self.global_regression_handle.write(f"File: {self.unique_name} Result: {string}\n")
-                rfile,_,_,rkey = SpawnFiles().open\
-                            (f"{self.unique_name}.out",subdir="regression",key=f"r-{unique_name}")
-                rfile.write(f"{string}\n")
-                break
-        if not found:
-            self.logfile.write\
-              (f"{self.unique_name}: regression failed to find <<{greptext}>>\n")
-            self.global_regression_handle.write\
-              (f"{self.unique_name}: regression failed to find <<{greptext}>>\n")
-        return rkey
-    def regression_line(self,output_file,rtest):
-        what_line = rtest["line"]
-        for line in output_file:
-            the_line = line.strip()
-            if what_line=="first":
-                break;
-        return_value = self.regression_line_pick_field(the_line,rtest)
-        return_value = self.regression_label_prepend(return_value,rtest)
-        return return_value
-    def apply_regression(self,rtest,filename):
-        ## get regression result from filename
-        rreturn = None; regger = None
-        if "line" in rtest.keys():
-            regger = self.regression_line
-        elif "grep" in rtest.keys():
-            regger = self.regression_grep
-        if regger:
+    def apply_regression(self,rtest,filename,extracted=None,scanned=False):
+        ## get regression result from filename, unless it was already extracted;
+        ## return dict with value, number of samples, stddev, table; or None
+        if not has_extractor(rtest):
+            return None
+        if not scanned:
             try:
-                with open(filename,"r") as output_file:
-                    rreturn = regger(output_file,rtest)
+                extracted = extract_regression(filename,rtest)
             except FileNotFoundError as e :
                 print(f"Could not open file for regression: <<{e}>>")
-        return rreturn
-    def do_regression(self,filename=None):
+                return None
+        if extracted is None or extracted==[]:
+            if "grep" in rtest.keys():
+                self.logwrite(f"{self.unique_name}: regression failed to find <<{rtest['greptext']}>>")
+            return None
+        table = None
+        if isinstance(extracted,dict):
+            ## the full curve, the value is the one in the last row
+            icol = table_column(extracted,rtest); rows = extracted["rows"]
+            table = { "columns":[ "x","y" ],
+                      "curve":[ (r[0],r[icol]) for r in rows if icol<len(r) ] }
+            if extracted["header"]:
+                columns = table_columns(extracted["header"])
+                if icol<len(columns):
+                    table["columns"] = [ re.sub(" ","_",columns[0]),re.sub(" ","_",columns[icol]) ]
+            if len(table["curve"])==0: return None
+            value = table["curve"][-1][1]; nsamples = len(table["curve"]); stddev = None
+            string = f"{value:.10g}"
+        elif isinstance(extracted,list):
+            value,stddev = reduce_samples(extracted,rtest)
+            string = f"{value:.10g}"; nsamples = len(extracted)
+        else:
+            string = self.regression_line_pick_field(extracted,rtest)
+            if string is None: return None
+            nsamples = 1; stddev = None
+            try:
+                value = float(string)
+            except ValueError:
+                value = None
+        return { "value":self.regression_label_prepend(string,rtest),"number":value,
+                 "samples":nsamples,"stddev":stddev,"table":table }
+    def do_regression(self,filename=None,extracted=None,scanned=False):
         ## regress on `filename', writing private and global file
         if not filename: filename = self.slurm_output_file_name
         self.logwrite(f"Doing regression <<{self.regression}>> on job {self.unique_name} from <<{filename}>>")
         print(f"Doing regression on {filename}")
+        if self.profiling: self.do_profile()
         if self.regression is None or self.regression=="none": return None
         rtest = regression_test_dict( self.regression )
-        ## rtest = self.get_regression_tests()
-        rreturn = self.apply_regression(rtest,filename)
-        if not rreturn: rreturn = "REGRESSION ERROR"
+        result = self.apply_regression(rtest,filename,extracted,scanned)
+        if not result:
+            result = { "value":"REGRESSION ERROR","number":None,"samples":0,"stddev":None,"table":None }
+        self.result = result
+        rreturn = result["value"]; samples = f"samples: {result['samples']}"
         rfilekey = None
-        self.logwrite(f".. done regression on {self.unique_name}, giving: {rreturn}")
-        self.global_regression_handle.write(rreturn+"\n")
+        self.logwrite(f".. done regression on {self.unique_name}, giving: {rreturn} {samples}")
+        self.global_regression_handle.write(f"File: {self.unique_name} Result: {rreturn} {samples}\n")
+        ## a job is journaled as done once this is on disk
+        self.global_regression_handle.flush()
         rfilename = f"{self.unique_name}.txt"
         rfilehandle,_,_,rfilekey \
           = SpawnFiles().open(rfilename,subdir="regression",new=True)
         self.logwrite(f"writing regression result <<{rreturn}>> to global and <<{rfilename}>>")
+        ## first line is the value, then metadata
         rfilehandle.write(rreturn+"\n")
+        rfilehandle.write(samples+"\n")
+        if result["stddev"] is not None:
+            rfilehandle.write(f"stddev: {result['stddev']:.10g}\n")
+        if self.profile:
+            rfilehandle.write(f"profile: {profile_line(self.profile)}\n")
+        if table := result["table"]:
+            ## the full curve goes at the end
+            rfilehandle.write(f"table: {table['columns'][0]} {table['columns'][1]}\n")
+            for x,y in table["curve"]:
+                rfilehandle.write(f"{x:.10g} {y:.10g}\n")
+        SpawnFiles().close_files( [rfilekey] )
+        if result["samples"]>0:
+            self.store_result(result)
         return rfilekey
+    def do_profile(self):
+        ## combine the profiles of the ranks, check them against the limits, record them
+        self.profile = collect_profile( self.profile_base() )
+        if self.profile is None:
+            self.logwrite(f"No profile found for {self.unique_name}"); return
+        self.logwrite(f"Profile of {self.unique_name}: {profile_line(self.profile)}")
+        if violations := profile_violations(self.profile,self.profiling["limits"]):
+            message = f"Profile limit exceeded by {self.unique_name}: {', '.join(violations)}"
+            print(message); self.logwrite(message)
+        ResultsStore().add_profile\
+            ( { "campaign":self.configuration.get("date",None),
+                "system":self.configuration.get("system",None),
+                "suite":self.suitename,"benchmark":self.program_name,
+                "nodes":int(self.nodes),"ppn":int(self.ppn),"threads":int(self.threads),
+                "unique_name":self.unique_name,"jobid":self.jobid if self.jobid!="1" else None,
+                **{ column:self.profile.get(k,None) for column,k
+                    in [ ("ranks","ranks"),("walltime","walltime"),("user","user"),
+                         ("system_time","system"),("maxrss","maxrss"),("exit_status","exit"),
+                         ("cpus","cpus"),("sockets","sockets"),("model","model") ] } } )
+    def store_result(self,result):
+        ## record in the results database
+        table = result["table"]
+        ResultsStore().add_result\
+            ( { "campaign":self.configuration.get("date",None),
+                "system":self.configuration.get("system",None),
+                "suite":self.suitename,"benchmark":self.program_name,
+                "nodes":int(self.nodes),"ppn":int(self.ppn),"threads":int(self.threads),
+                "modules":self.modules,"unique_name":self.unique_name,
+                "jobid":self.jobid if self.jobid!="1" else None,
+                "outputdir":os.path.abspath(SpawnFiles().outputdir),"regression":self.regression,
+                "value":result["number"],"text":result["value"],
+                "samples":result["samples"],"stddev":result["stddev"] },
+              curve=table["curve"] if table else None )
+        if self.cache_key:
+            ResultsStore().cache_store\
+                ( self.cache_key,
+                  { "unique_name":self.unique_name,"jobid":self.jobid if self.jobid!="1" else None,
+                    "regression_file":os.path.abspath(f"{SpawnFiles().outputdir}/regression/{self.unique_name}.txt"),
+                    "output_file":os.path.abspath(self.slurm_output_file_name) } )
 
-def parse_suite(suite_option_list):
+##
+## a job array combines all jobs of a suite with the same node count
+## into one slurm submission; each element looks up its parameters
+## in a table, and writes its own output file
+##
+class JobArray():
+    def __init__(self,name,queue,nodes):
+        self.name = name; self.queue = queue; self.nodes = nodes
+        self.jobs = []; self.jobid = None
+        scriptdir = SpawnFiles().ensurefiledir(subdir="scripts")
+        self.script_file_name = f"{scriptdir}/{name}.script"
+        self.table_file_name = f"{scriptdir}/{name}.table"
+    def add(self,job):
+        job.array_index = len(self.jobs)
+        self.jobs.append(job)
+    def throttle(self):
+        ## queue limit becomes the %N throttle of the array
+        try:
+            return Queues().queues[self.queue].limit
+        except KeyError:
+            return 1
+    def launch_line(self,runner,profiling):
+        if runner.strip()=="ibrun":
+            return f"ibrun -n $(( SLURM_NNODES * ppn )) -o 0 {profiler(profiling)}$program $args"
+        else: return f"{runner}{profiler(profiling)}$program $args"
+    def parameter_table(self):
+        table = ""
+        for j in self.jobs:
+            table += f"{j.array_index} {j.programdir}/{j.program_name} {j.ppn} {j.threads}" \
+                +f" {os.path.abspath(j.slurm_output_file_name)} {j.unique_name} {j.args or ''}\n"
+        return table
+    def script_contents(self):
+        job = self.jobs[0]
+        ppn = max( [ int(j.ppn) for j in self.jobs ] )
+        outputdir = os.path.abspath(job.outputdir)
+        sbatch = ""
+        for s in job.sbatch:
+          sbatch += f"""#SBATCH {s}
+"""
+        return \
+f"""#!/bin/bash
+#SBATCH -J {self.name}
+#SBATCH -o {outputdir}/{self.name}-%a.slurm-out
+#SBATCH -e {outputdir}/{self.name}-%a.slurm-out
+#SBATCH -p {self.queue}
+#SBATCH -t {job.time}
+#SBATCH -N {self.nodes}
+#SBATCH --tasks-per-node {ppn}
+#SBATCH -A {job.account}
+#SBATCH --array=0-{len(self.jobs)-1}%{self.throttle()}
+{sbatch}
+
+{job.modules_load_line()}{env_spec(job.environment)}
+cd {outputdir}
+## parameters of this array element; the program arguments are the rest of the line
+read program ppn threads output name args <<< $( awk -v i=$SLURM_ARRAY_TASK_ID '$1==i {{$1=""; print substr($0,2)}}' {os.path.abspath(self.table_file_name)} )
+exec > "$output" 2>&1
+{profile_spec(job.profiling,os.path.abspath(SpawnFiles().outputdir)+"/profile/$name")}if [ $threads -ne 0 ] ; then
+  ## OpenMP thread specification
+  if [ $threads -gt 0 ] ; then threadcount=$threads
+  else threadcount=$(( SLURM_CPUS_ON_NODE / ppn )) ; fi
+  if [ $threadcount -lt 1 ] ; then threadcount=1 ; fi
+  export OMP_NUM_THREADS=$threadcount
+  export OMP_PROC_BIND=true
+fi
+if [ ! -f "$program" ] ; then 
+  echo "Program does not exist: $program"
+  exit 1
+fi
+{self.launch_line(job.runner,job.profiling)}
+"""
+    def write_script(self):
+        with open(self.table_file_name,"w") as table:
+            table.write(self.parameter_table())
+        with open(self.script_file_name,"w") as script:
+            script.write(self.script_contents()+"\n")
+        SpawnFiles().get("logfile").write\
+            (f"Array script={self.script_file_name} elements={len(self.jobs)}\n")
+    def submit(self):
+        if self.jobid: return self.jobid
+        print(f"sbatch: {self.script_file_name} ({len(self.jobs)} elements)")
+        for line in SlurmStatus().submit(self.script_file_name):
+            line = line.strip()
+            SpawnFiles().get("logfile").write(line+"\n")
+            if submitted := re.search("(Submitted.* )([0-9]+)",line):
+                self.jobid = submitted.groups()[1]
+                ## registered before the ids are visible to the status polling
+                for j in self.jobs:
+                    SlurmStatus().register_submission(self.element_id(j),self.queue)
+                for j in self.jobs:
+                    j.set_has_been_submitted( self.element_id(j) )
+                return self.jobid
+        raise Exception(f"Failure to submit <<{self.script_file_name}>>")
+    def element_id(self,job):
+        return f"{self.jobid}_{job.array_index}"
+
+##
+## a pack runs all jobs of a suite with the same ppn in one allocation
+## of the largest node count: jobs that fit next to each other run concurrently
+## on disjoint nodes, then the next wave starts. Each job writes its own output file.
+##
+class JobPack(JobArray):
+    def __init__(self,name,queue,ppn):
+        JobArray.__init__(self,name,queue,0)
+        self.ppn = int(ppn)
+    def waves(self):
+        ## first fit, largest jobs first: list of waves, each a list of (job,node offset)
+        self.nodes = max( [ int(j.nodes) for j in self.jobs ] )
+        waves = []
+        for j in sorted( self.jobs,key=lambda j:-int(j.nodes) ):
+            n = int(j.nodes)
+            for w in waves:
+                if w["used"]+n<=self.nodes:
+                    w["jobs"].append( (j,w["used"]) ); w["used"] += n
+                    break
+            else:
+                waves.append( { "used":n,"jobs":[ (j,0) ] } )
+        return waves
+    def wall_time(self,waves):
+        ## each wave takes as long as its longest job
+        seconds = sum( [ max( [ slurm_seconds(j.time) or 0 for j,_ in w["jobs"] ] )
+                         for w in waves ] )
+        return f"{seconds//3600}:{(seconds//60)%60:02}:{seconds%60:02}"
+    def launch_line(self,job,offset):
+        program = f"$program {job.args}" if job.args else "$program"
+        program = profiler(job.profiling)+program
+        if job.runner.strip()=="ibrun":
+            ## task offset: the allocation has ppn tasks on every node
+            return f"ibrun -n {int(job.nodes)*self.ppn} -o {offset*self.ppn} {program}"
+        else:
+            return f"srun --nodes=1 --ntasks=1 --relative={offset} --exact {job.runner}{program}"
+    def job_block(self,job,offset):
+        threads = int(job.threads)
+        if threads>0: threadcount = threads
+        elif threads<0: threadcount = f"$(( SLURM_CPUS_ON_NODE / {self.ppn} ))"
+        else: threadcount = None
+        exports = "".join( [ f"  export {name}={value}\n" for name,value in job.environment.items() ] )
+        if threadcount is not None:
+            exports += f"  export OMP_NUM_THREADS={threadcount}\n  export OMP_PROC_BIND=true\n"
+        exports += "".join( [ f"  {line}\n" for line
+                              in profile_spec(job.profiling,job.profile_base()).splitlines() ] )
+        return \
+f"""## {job.unique_name}: {job.nodes} nodes from node {offset}
+(
+{exports}  program={job.programdir}/{job.program_name}
+  if [ ! -f "$program" ] ; then 
+    echo "Program does not exist: $program"
+    exit 1
+  fi
+  {self.launch_line(job,offset)}
+) > {os.path.abspath(job.slurm_output_file_name)} 2>&1 &
+"""
+    def script_contents(self):
+        waves = self.waves(); self.time = self.wall_time(waves)
+        job = self.jobs[0]
+        outputdir = os.path.abspath(job.outputdir)
+        sbatch = "".join( [ f"#SBATCH {s}\n" for s in job.sbatch ] )
+        runs = ""
+        for i,w in enumerate(waves):
+            runs += f"\n#### wave {i}: {len(w['jobs'])} jobs on {w['used']} nodes\n"
+            runs += "".join( [ self.job_block(j,offset) for j,offset in w["jobs"] ] )
+            runs += "wait\n"
+        return \
+f"""#!/bin/bash
+#SBATCH -J {self.name}
+#SBATCH -o {outputdir}/{self.name}.slurm-out
+#SBATCH -e {outputdir}/{self.name}.slurm-out
+#SBATCH -p {self.queue}
+#SBATCH -t {self.time}
+#SBATCH -N {self.nodes}
+#SBATCH --tasks-per-node {self.ppn}
+#SBATCH -A {job.account}
+{sbatch}
+
+{job.modules_load_line()}
+cd {outputdir}
+{runs}"""
+    def write_script(self):
+        with open(self.script_file_name,"w") as script:
+            script.write(self.script_contents()+"\n")
+        SpawnFiles().get("logfile").write\
+            (f"Pack script={self.script_file_name} jobs={len(self.jobs)} nodes={self.nodes}\n")
+    def element_id(self,job):
+        ## all jobs of the pack are one slurm job
+        return self.jobid
+
+def repeat_options(spec):
+    ## `repeat 3 ci:5percent max:10 level:0.95 seed:1' -> dict
+    options = { "count":"1","ci":None,"max":None,"level":"0.95","seed":"0" }
+    for w in spec.split():
+        if re.search(":",w):
+            k,v = w.split(":",1)
+            if k not in options.keys():
+                raise Exception(f"Unknown repeat option: <<{w}>>")
+            options[k] = v
+        else:
+            options["count"] = w
+    options["count"] = int(options["count"])
+    if options["count"]<1:
+        raise Exception(f"Repeat count needs to be at least 1: <<{spec}>>")
+    if ci := options["ci"]:
+        if perc := re.match(r'([0-9.]+)p',ci):
+            options["ci"] = float(perc.groups()[0])/100
+        else:
+            options["ci"] = float(ci)
+        options["max"] = int(options["max"]) if options["max"] else max(10,options["count"])
+    else:
+        options["max"] = options["count"]
+    options["level"] = float(options["level"]); options["seed"] = int(options["seed"])
+    options["repeating"] = options["max"]>1
+    return options
+
+def t_quantile(p,df):
+    ## quantile of the Student t distribution: exact for one and two degrees of freedom,
+    ## otherwise a Cornish-Fisher expansion around the normal quantile
+    if df==1:
+        return math.tan( math.pi*(p-0.5) )
+    if df==2:
+        return (2*p-1)/math.sqrt( 2*p*(1-p) )
+    z = statistics.NormalDist().inv_cdf(p)
+    return z + (z**3+z)/(4*df) + (5*z**5+16*z**3+3*z)/(96*df**2) \
+        + (3*z**7+19*z**5+17*z**3-15*z)/(384*df**3)
+
+def confidence_halfwidth(values,level=0.95):
+    ## half width of the confidence interval of the mean
+    if len(values)<2: return None
+    return t_quantile( (1+level)/2,len(values)-1 ) \
+        * statistics.stdev(values)/math.sqrt(len(values))
+
+##
+## the repetitions of one configuration: a fixed number, or in adaptive mode
+## more until the confidence interval of the mean is narrow enough
+##
+class Repetitions():
+    def __init__(self,suite,name,options,spec):
+        self.suite = suite; self.name = name; self.options = options
+        ## what the suite needs to create another repetition
+        self.spec = spec
+        self.jobs = []; self.complete = False
+        self.lock = threading.Lock()
+    def numbers(self):
+        return [ j.result["number"] for j in self.jobs
+                 if j.result and j.result["number"] is not None ]
+    def needs_more(self):
+        if self.options["ci"] is None or len(self.jobs)>=self.options["max"]:
+            return False
+        values = self.numbers()
+        if len(values)==0:
+            ## no results at all: repeating will not help
+            return False
+        if len(values)==1:
+            return True
+        mean = statistics.mean(values)
+        return confidence_halfwidth(values,self.options["level"])>self.options["ci"]*abs(mean)
+    def done(self,job,more=True):
+        ## called after the post-processing of each repetition, or with more=False
+        ## for one that is not run; then no further repetitions are added
+        with self.lock:
+            if self.complete or not all( [ j.processed or j is job for j in self.jobs ] ):
+                return
+            if more and self.needs_more():
+                self.suite.add_repetition(self)
+            else:
+                self.complete = True
+                self.summarize()
+    def summarize(self):
+        ## mean over the repetitions goes in the global and a private regression file
+        values = self.numbers()
+        if len(values)==0: return
+        n = len(values); mean = statistics.mean(values)
+        stddev = statistics.stdev(values) if n>1 else None
+        halfwidth = confidence_halfwidth(values,self.options["level"])
+        value = f"{mean:.10g}"
+        self.jobs[0].global_regression_handle.write(f"File: {self.name} Result: {value} samples: {n}\n")
+        rfile,_,_,rkey = SpawnFiles().open(f"{self.name}.txt",subdir="regression",new=True)
+        rfile.write(f"{value}\nsamples: {n}\n")
+        if stddev is not None:
+            rfile.write(f"stddev: {stddev:.10g}\n")
+        if halfwidth is not None:
+            rfile.write(f"ci: {halfwidth:.10g} level: {self.options['level']}\n")
+        SpawnFiles().close_files( [rkey] )
+        interval = f", confidence interval +/- {halfwidth:.4g}" if halfwidth is not None else ""
+        self.suite.tracemsg(f"{self.name}: {n} repetitions, mean {value}{interval}")
+
+def read_regression_file(path):
+    ## parse a per-job regression file: value on the first line, then metadata,
+    ## then optionally a table
+    result = { "value":None,"samples":None,"stddev":None,"table":None,"profile":None }
+    with open(path,"r") as rfile:
+        result["value"] = rfile.readline().strip()
+        for line in rfile:
+            line = line.strip()
+            if result["table"] is not None:
+                x,y = line.split()
+                result["table"]["curve"].append( (float(x),float(y)) )
+            elif line.startswith("table:"):
+                result["table"] = { "columns":line.split()[1:],"curve":[] }
+            elif re.match("(samples|stddev):",line):
+                k,v = line.split(":",1)
+                result[k] = float(v)
+            elif line.startswith("profile:"):
+                result["profile"] = parse_profile_line( line.split(":",1)[1] )
+    return result
+
+##
+## comparison of two runs: all results are loaded, joined on job name,
+## and compared in bulk
+##
+def load_regression_results(rdir,names=None):
+    ## job name -> parsed regression file, for all (or the named) jobs in a directory
+    results = {}
+    for f in os.listdir(rdir):
+        if not f.endswith(".txt"): continue
+        name = f[:-4]
+        if names is not None and name not in names: continue
+        results[name] = read_regression_file( os.path.join(rdir,f) )
+    return results
+
+def regression_number(value):
+    ## numeric value of a regression string; labels come before the number
+    try:
+        return float( value.split()[-1] )
+    except (ValueError,IndexError,AttributeError):
+        return None
+
+def parse_margin(margin):
+    ## margin:10percent, margin:0.5abs, margin:3sigma
+    if m := re.match(r'^([0-9.]+)p',margin):
+        return "relative",float(m.groups()[0])/100
+    elif m := re.match(r'^([0-9.]+)abs',margin):
+        return "absolute",float(m.groups()[0])
+    elif m := re.match(r'^([0-9.]+)sigma',margin):
+        return "sigma",float(m.groups()[0])
+    raise Exception(f"Unknown margin specification: <<{margin}>>")
+
+def comparison_rows(oresults,cresults):
+    ## one row per metric per job in both runs: the value, and each point of a curve
+    rows = []
+    for name in sorted( set(oresults.keys()) & set(cresults.keys()) ):
+        o = oresults[name]; c = cresults[name]
+        rows.append( { "name":name,"metric":"value",
+                       "output":regression_number(o["value"]),"compare":regression_number(c["value"]),
+                       "otext":o["value"],"ctext":c["value"],
+                       "ostd":o["stddev"],"cstd":c["stddev"] } )
+        if o["table"] and c["table"]:
+            ccurve = dict( c["table"]["curve"] ); xname = o["table"]["columns"][0]
+            for x,y in o["table"]["curve"]:
+                if x in ccurve.keys():
+                    rows.append( { "name":name,"metric":f"{xname}={x:g}",
+                                   "output":y,"compare":ccurve[x],
+                                   "otext":f"{y:g}","ctext":f"{ccurve[x]:g}",
+                                   "ostd":None,"cstd":None } )
+        if o["profile"] and c["profile"]:
+            ## memory and runtime blowups show up even if the value is fine
+            for metric in [ "walltime","maxrss" ]:
+                if metric in o["profile"].keys() and metric in c["profile"].keys():
+                    y = o["profile"][metric]; cy = c["profile"][metric]
+                    rows.append( { "name":name,"metric":metric,"output":y,"compare":cy,
+                                   "otext":f"{y:g}","ctext":f"{cy:g}",
+                                   "ostd":None,"cstd":None } )
+    return rows
+
+def compare_rows(rows,margin=None):
+    ## compute deltas and severities for all rows at once;
+    ## severity above 1 means outside the margin
+    numeric = [ r for r in rows if r["output"] is not None and r["compare"] is not None ]
+    for r in rows:
+        r["delta"] = None; r["relative"] = None; r["severity"] = None
+    for r in numeric:
+        r["delta"] = r["output"]-r["compare"]
+        r["relative"] = r["delta"]/r["compare"] if r["compare"]!=0 else \
+                        ( 0. if r["delta"]==0 else math.inf )
+    if margin is None: return rows
+    kind,amount = parse_margin(margin)
+    if kind=="relative":
+        for r in numeric:
+            more = r["relative"]
+            less = -r["delta"]/r["output"] if r["output"]!=0 else ( 0. if r["delta"]==0 else math.inf )
+            r["severity"] = max(more,less)/amount
+    elif kind=="absolute":
+        for r in numeric:
+            r["severity"] = abs(r["delta"])/amount
+    else:
+        ## per-job standard deviations if known, otherwise the spread over all jobs
+        finite = [ r["relative"] for r in numeric if math.isfinite(r["relative"]) ]
+        mean = statistics.fmean(finite) if len(finite)>0 else 0.
+        spread = statistics.stdev(finite) if len(finite)>1 else 0.
+        for r in numeric:
+            sigma = math.sqrt( (r["ostd"] or 0.)**2+(r["cstd"] or 0.)**2 )
+            if sigma>0:
+                z = abs(r["delta"])/sigma
+            elif spread>0:
+                z = abs(r["relative"]-mean)/spread
+            else:
+                z = 0. if r["delta"]==0 else math.inf
+            r["severity"] = z/amount
+    return rows
+
+def parse_suite(suite_option_list,quiet=False):
   suite = { "name" : "unknown", "runner" : "", "dir" : "./", "apps" : [] }
   for opt in suite_option_list:
     if re.search(":",opt):
@@ -447,102 +1504,299 @@ def parse_suite(suite_option_list):
         dir = suite["dir"]
         if not os.path.exists(dir) or not os.path.isdir(dir):
           raise Exception("No such directory: <<{}>>".format(dir))
-        p = sp.Popen( "cd {} ; ls {}".format( dir,opt ),\
-                      stdout=sp.PIPE,shell=True )
-        out,err = p.communicate()
-        for a in out.split():
-          suite["apps"].append(a.decode("utf-8"))
-        print("application wildcards gives apps <<{}>>".format(suite["apps"]))
+        ## sorted like `ls'
+        suite["apps"] += sorted( fnmatch.filter( os.listdir(dir),opt ) )
+        if not quiet:
+          print("application wildcards gives apps <<{}>>".format(suite["apps"]))
       else:
         suite["apps"].append(opt)
   return suite
 
 ##
-## return nodes and cores as list of equal length
+## all squeue traffic goes through one cache:
+## a single `squeue -u' call per polling interval covers all queues and jobs
+## this is a singleton class
 ##
-def nodes_cores_threads_values(configuration):
-  def str2set(s):
-    if re.search(",",s):
-      s = [ int(p) for p in s.split(",") ]
-    elif re.search(":",s):
-      print("colon notation not yet supported"); raise Exception()
-    else:
-      s = [ int(s) ]
-    return s    
-  nodes = configuration.get("nodes","1")
-  cores = configuration.get("cores",None)
-  if not cores is None:
-    print("Cores keyword not supported"); raise Exception()
-  ppn   = configuration.get("ppn","1")
-  threads = configuration.get("threads","0")
-
-  ## nodes
-  print(f"""Parallel configuration:
-nodes: {nodes}
-ppn: {ppn}
-threads: {threads}
-""")
-  nodes = str2set(nodes); ppn = str2set(ppn); threads = str2set(threads)
-  
-  ##
-  ## node/core combinations
-  ##
-  nodes_cores_threads = [ [ [ [n,p,t] 
-                      for n in nodes ] 
-                    for p in ppn ] 
-                  for t in threads ]
-  nodes_cores_threads = [ n for npt in nodes_cores_threads
-                          for np in npt for n in np ] 
-  print("nodes_cores_threads:",nodes_cores_threads)
-  return nodes_cores_threads
+class SlurmStatus():
+  instance = None
+  class __slurmstatus():
+    def __init__(self):
+      self.user = None
+      self.ttl = 5.          # seconds that an squeue result is considered current
+      self.min_interval = 1. # global rate limit: seconds between Slurm calls
+      self.statuses = {}; self.partitions = {}
+      self.registered = {}   # id -> (queue,time) of submissions, until squeue has seen them
+      self.last_query = None; self.last_rpc = None
+      self.failures = 0; self.retry_at = None # back-off after failed squeue calls
+      self.events = {}       # seconds from last query until expected start or end
+      self.counters = { "requests":0, "squeue":0, "sbatch":0, "sacct":0, "throttled":0, "failed":0 }
+      self.lock = threading.Lock()
+      self.debug = False
+      self.backend = SlurmBackend()
+    def set_backend(self,spec):
+      self.backend = make_backend(spec)
+      if self.backend.name=="local":
+        ## no scheduler to protect, and every query should see finished jobs
+        self.ttl = 0.; self.min_interval = 0.
+    def set_ttl(self,ttl):
+      self.ttl = float(ttl)
+    def set_rate(self,interval):
+      self.min_interval = float(interval)
+    def throttle(self,command):
+      ## enforce the global rate limit on Slurm calls, then count this call
+      with self.lock:
+        now = time.time()
+        if self.last_rpc is not None and now-self.last_rpc<self.min_interval:
+          self.counters["throttled"] += 1
+          time.sleep( self.last_rpc+self.min_interval-now )
+        self.last_rpc = time.time()
+        self.counters[command] += 1
+    def is_current(self):
+      return self.last_query is not None \
+        and time.time()-self.last_query<self.ttl
+    def refresh(self,user=None):
+      if user: self.user = user
+      user = self.user if self.user else os.environ.get("USER","")
+      ## after a failure the previous statuses stay in use until the back-off is over
+      if self.retry_at is not None and time.time()<self.retry_at: return
+      self.throttle("squeue")
+      ## `-r' lists array elements individually, as <arrayid>_<index>
+      statuses = {}; partitions = {}; events = {}
+      started = time.time(); now = datetime.datetime.now()
+      try:
+        lines = self.backend.squeue(user,"%i %t %P %S %L")
+      except SlurmCallFailed as e:
+        ## an empty table would make every job look finished
+        self.failures += 1; self.counters["failed"] += 1
+        backoff = min( 2.**self.failures,300. )
+        self.retry_at = time.time()+backoff
+        print(f"{e}; keeping the previous job status for {backoff:.0f} seconds")
+        return
+      self.failures = 0; self.retry_at = None
+      for status in lines:
+        fields = status.split()
+        if len(fields)<3: continue
+        id,stat,partition = fields[:3]
+        statuses[id] = stat; partitions[id] = partition
+        if len(fields)<5: continue
+        ## pending: expected start; running: time left
+        if stat=="PD":
+          try:
+            events[id] = ( datetime.datetime.fromisoformat(fields[3])-now ).total_seconds()
+          except ValueError: pass
+        elif stat=="R":
+          if ( left := slurm_seconds(fields[4]) ) is not None:
+            events[id] = left
+      with self.lock:
+        ## a job submitted while squeue ran is not in its output, but it has not finished
+        for id,(qname,t) in list( self.registered.items() ):
+          if t>=started and id not in statuses:
+            statuses[id] = "PD"; partitions[id] = qname
+          else: del self.registered[id]
+        self.statuses = statuses; self.partitions = partitions; self.events = events
+        self.last_query = time.time()
+      if self.debug:
+        print(f"squeue for user={user}: {len(statuses)} jobs")
+    def query(self,user=None,force=False):
+      ## return id->status dict for all jobs of the user
+      self.counters["requests"] += 1
+      if force or not self.is_current():
+        self.refresh(user)
+      return self.statuses
+    def status(self,jobid,user=None):
+      ## status of one job; "NS" means not found in slurm
+      return self.query(user).get(jobid,"NS")
+    def jobids_in_queue(self,qname,user=None):
+      statuses = self.query(user)
+      return [ id for id,q in self.partitions.items() if q==qname and id in statuses ]
+    def next_event(self,ids):
+      ## seconds until the first expected start or end among these jobs, or None
+      events = [ self.events[id] for id in ids if id in self.events.keys() ]
+      if len(events)==0: return None
+      return max( 0, min(events)-(time.time()-self.last_query) )
+    def register_submission(self,jobid,qname):
+      ## a freshly submitted job counts as pending until the next squeue says otherwise;
+      ## under the lock, so that a refresh either merges it or happens before it
+      with self.lock:
+        self.statuses[jobid] = "PD"; self.partitions[jobid] = qname
+        self.registered[jobid] = (qname,time.time())
+    def accounting(self,jobids,chunk=500):
+      #
+      # accounting records of finished jobs, from one sacct call per chunk of ids;
+      # array jobs come back per element, as <arrayid>_<index>; empty if there is no sacct
+      #
+      records = {}
+      jobids = sorted( set(jobids) )
+      for i in range(0,len(jobids),chunk):
+        self.throttle("sacct")
+        try:
+          lines = self.backend.sacct(jobids[i:i+chunk],sacct_fields)
+        except FileNotFoundError:
+          return records
+        records.update( parse_sacct(lines) )
+      return records
+    def submit(self,script):
+      ## output lines of sbatch
+      self.throttle("sbatch")
+      return self.backend.sbatch(script)
+    def saved(self):
+      return self.counters["requests"]-self.counters["squeue"]
+    def __str__(self):
+      c = self.counters
+      return f"Slurm calls ({self.backend}): squeue={c['squeue']} sbatch={c['sbatch']} sacct={c['sacct']}" \
+        +f" status requests={c['requests']} saved={self.saved()} throttled={c['throttled']}" \
+        +( f" failed={c['failed']}" if c["failed"]>0 else "" )
+  def __new__(cls):
+    if not SlurmStatus.instance:
+      SlurmStatus.instance = SlurmStatus.__slurmstatus()
+    return SlurmStatus.instance
+  def __getattr__(self,attr):
+    return self.instance.__getattr__(attr)
+
+##
+## polling interval that adapts to what is happening:
+## fast after a change or when a job is expected to start or finish,
+## exponentially slower while nothing happens
+##
+class AdaptivePoll():
+    def __init__(self,fastest=2,slowest=120):
+        self.fastest = float(fastest); self.slowest = float(slowest)
+        self.interval = self.fastest
+    def next(self,changed,next_event=None):
+        if changed:
+            self.interval = self.fastest
+        else:
+            self.interval = min( 2*self.interval,self.slowest )
+        interval = self.interval
+        if next_event is not None:
+            interval = max( self.fastest,min(interval,next_event) )
+        return interval
 
 def running_jobids(qname,user):
-    ids = []
-    p = sp.Popen(["squeue","-u",user,"-p",qname,"-h","-o","%A %t"],stdout=sp.PIPE)
-    for status in io.TextIOWrapper(p.stdout, encoding="utf-8"):
-        status = status.strip() # print("job status line <<{}>>".format(status))
-        id,stat = status.split()
-        ids.append(id)
+    ids = SlurmStatus().jobids_in_queue(qname,user)
     print("Running jobs for user={} on queue={}: {}".format(user,qname,ids))
     return ids
 
+##
+## orderings of the unsubmitted jobs of a queue
+##
+def order_fifo(jobs):
+    return jobs
+def order_largest(jobs):
+    ## largest allocations first, smaller ones fill the gaps: shortens the campaign
+    return sorted( jobs,key=lambda j:-j.allocation()[0]*j.allocation()[1] )
+def order_shortest(jobs):
+    return sorted( jobs,key=lambda j:( j.allocation()[1],j.allocation()[0] ) )
+def order_roundrobin(jobs):
+    ## alternate between benchmarks
+    benchmarks = {}
+    for j in jobs:
+        benchmarks.setdefault( j.program_name,[] ).append(j)
+    rounds = itertools.zip_longest( *benchmarks.values() )
+    return [ j for r in rounds for j in r if j is not None ]
+queue_orders = { "fifo":order_fifo,"largest":order_largest,
+                 "shortest":order_shortest,"roundrobin":order_roundrobin }
+
 class Queue():
     def __init__(self,name,limit=1):
         self.name = name; self.jobs = []; self.set_limit(limit); self.debug = False
+        ## optional policies: maximum nodes in use, budget in node-hours, submission order
+        self.max_nodes = None; self.budget = None; self.order = "fifo"
+        self.spent = 0.; self.skipped = 0; self.failed = 0
+        ## submission can happen from job generation and from the scheduler
+        self.submit_lock = threading.Lock()
     def set_limit(self,limit):
         self.limit = int(limit)
+    def set_policy(self,nodes=None,budget=None,order=None):
+        if nodes is not None: self.max_nodes = int(nodes)
+        if budget is not None: self.budget = float(budget)
+        if order is not None:
+            if order not in queue_orders.keys():
+                raise Exception(f"Unknown queue order <<{order}>>, use: {list(queue_orders.keys())}")
+            self.order = order
+    def has_policy(self):
+        return self.order!="fifo" or self.max_nodes is not None or self.budget is not None
     def enqueue(self,j):
-        self.jobs.append(j)
-        qrunning = running_jobids(self.name,j.user)
-        if len(qrunning)<self.limit:
-            ## this may throw an exception if QoS exceeded
-            jobid = j.submit()
-    def status_update(self,status_dict):
+        with self.submit_lock:
+            self.jobs.append(j)
+            ## with a policy the scheduler decides, once all jobs are known
+            if self.has_policy(): return
+            qrunning = running_jobids(self.name,j.user)
+            ## resumed jobs can already be in slurm
+            if len(qrunning)<self.limit and not j.get_has_been_submitted():
+                ## this may throw an exception if QoS exceeded
+                jobid = j.submit()
+                self.spent += j.cost()
+    def status_update(self,status_dict,known=None):
         #
-        # use the squeue output
+        # use the squeue output; return the jobs that have just finished;
+        # a job that is not found only finishes if its id is `known' from before the query
         #
+        finished = []
         for j in self.jobs:
-            if j.jobid in status_dict.keys():
-                j.status_update(status_dict[j.jobid])
-            else:
-                j.status_update("NS") # not found in slurm
-        nrunning = sum( [ 1 for j in self.jobs if j.is_running() ] ) \
-                   + sum( [ 1 for j in self.jobs if j.is_pending() ] )
-        nslots = self.limit-nrunning
-        if self.debug: 
-          print(f"Queue {self.name} has #in queue={nrunning}, space for: {nslots}")
+            # jobs not found in slurm get "NS"
+            status = status_dict.get(j.jobid,"NS")
+            if status=="NS" and known is not None and j.jobid not in known:
+                continue
+            if j.status_update(status):
+                finished.append(j)
+        return finished
+    def submit_pending(self):
+        with self.submit_lock:
+            self.submit_into_free_slots()
+    def log_decision(self,msg):
+        SpawnFiles().get("logfile").write(f"schedule {self.name} order={self.order}: {msg}\n")
+        if self.debug: print(f"schedule {self.name}: {msg}")
+    def submit_into_free_slots(self):
+        #
+        # submit unsubmitted jobs into the free slots of this queue,
+        # in the order of the queue policy, within its node and budget limits
+        #
+        ## jobs of a pack share one slurm job
+        active = {}
         for j in self.jobs:
-            if nslots==0: break
-            if not j.get_has_been_submitted():
-                try :
-                    j.submit()
-                    nslots -= 1
-                except :
-                    print(f"Failed to submit")
-                    self.jobs.remove(j)
-                    continue
+            if j.is_running() or j.is_pending():
+                active[j.jobid] = j.allocation()[0]
+        nslots = self.limit-len(active)
+        free = self.max_nodes-sum( active.values() ) if self.max_nodes is not None else None
+        if self.debug: 
+          print(f"Queue {self.name} has #in queue={len(active)}, space for: {nslots}, free nodes: {free}")
+        candidates = queue_orders[self.order]\
+            ( [ j for j in self.jobs if not j.get_has_been_submitted() ] )
+        for j in candidates:
+            if nslots<=0: break
+            if j.get_has_been_submitted(): continue ## other element of a pack or array
+            nodes,hours = j.allocation(); cost = j.cost()
+            if self.budget is not None and self.spent+cost>self.budget:
+                self.log_decision(f"skip {j.unique_name}: {cost:.1f} node-hours"
+                                  +f" exceeds the remaining budget {self.budget-self.spent:.1f}")
+                self.jobs.remove(j); self.skipped += 1
+                if j.repetitions: j.repetitions.done(j,more=False)
+                j.processed = True; j.journal("SKIPPED")
+                continue
+            if free is not None and nodes>free:
+                if nodes>self.max_nodes:
+                    raise Exception(f"Job {j.unique_name} needs {nodes} nodes, queue maximum is {self.max_nodes}")
+                self.log_decision(f"defer {j.unique_name}: needs {nodes} nodes, {free} free")
+                continue
+            try :
+                j.submit()
+            except Exception as e:
+                ## the job is done as far as its suite is concerned
+                print(f"Failed to submit {j.unique_name}: {e}")
+                self.log_decision(f"failed {j.unique_name}: {e}")
+                self.jobs.remove(j); self.failed += 1
+                if j.repetitions: j.repetitions.done(j,more=False)
+                j.processed = True; j.journal("FAILED")
+                continue
+            nslots -= 1; self.spent += cost
+            if free is not None: free -= nodes
+            self.log_decision(f"submit {j.unique_name} id={j.jobid}: {nodes} nodes, {hours:.2f} hours;"
+                              +f" free nodes {free}, node-hours spent {self.spent:.1f}")
     def how_many_unfinished(self):
         return sum( [ 1 for j in self.jobs if not j.done_running() ] )
+    def has_unsubmitted(self):
+        return any( [ not j.get_has_been_submitted() for j in self.jobs ] )
     def ids(self):
         return [ j.jobid for j in self.jobs if j.jobid!="1" ]
 
@@ -553,12 +1807,14 @@ class Queues():
             self.queues = {}
             self.testing = kwargs.get("testing",False)
             self.debug = False
+            self.poll_min = 2; self.poll_max = 120
             self.logprinter = kwargs.get( "logprinter",lambda x:print("log message:",x) )
-        def add_queue(self,name,limit):
+        def add_queue(self,name,limit,**policy):
             if name in self.queues.keys():
               self.queues[name].set_limit(limit)
             else:
               self.queues[name] = Queue(name,limit)
+            self.queues[name].set_policy(**policy)
         def set_limit(self,name,limit):
             if not name in self.queues.keys():
                 raise Exception(f"Can only set limit for existing queue, not: {name}")
@@ -577,39 +1833,116 @@ class Queues():
             if self.testing:
                 print("Done, since this was only a test")
             else:
-                while True:
-                    njobs_to_go = self.update_jobs_status()
-                    if njobs_to_go==0: break
-                    time.sleep(10)
+                asyncio.run( self.watch_jobs() )
                 self.logprinter("Done all jobs")
-        def update_jobs_status(self):
+                self.logprinter(str(SlurmStatus()))
+                self.logprinter(self.usage())
+        async def watch_jobs(self,until=None,progress=None):
+            #
+            # concurrent tasks: status polling, submission into free queue slots,
+            # and post-processing and regression of jobs as they finish
+            # with `until' we keep watching for new jobs until that event is set,
+            # `progress' is notified after each post-processed job
+            #
+            loop = asyncio.get_running_loop()
+            postprocessor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+            finished = asyncio.Queue(); slots = asyncio.Event()
+            poll = AdaptivePoll(self.poll_min,self.poll_max)
+            async def postprocess():
+                while True:
+                    job = await finished.get()
+                    try:
+                        await loop.run_in_executor(postprocessor,job.postprocess)
+                    except Exception as e:
+                        print(f"Post-processing of {job.unique_name} failed: {e}")
+                    finished.task_done()
+                    if progress:
+                        async with progress:
+                            progress.notify_all()
+            async def submit():
+                while True:
+                    await slots.wait(); slots.clear()
+                    await loop.run_in_executor(None,self.submit_pending)
+                    ## jobs that failed to submit or were skipped are finished too
+                    if progress:
+                        async with progress:
+                            progress.notify_all()
+            tasks = [ asyncio.create_task(postprocess()),asyncio.create_task(submit()) ]
+            while True:
+                done,changed,ntogo = await loop.run_in_executor(None,self.poll_jobs)
+                for j in done:
+                    finished.put_nowait(j)
+                if self.has_unsubmitted(): slots.set()
+                if ntogo==0 and until is None:
+                    ## post-processing can add jobs, such as extra repetitions
+                    await finished.join()
+                    if sum( [ q.how_many_unfinished() for q in self.queues.values() ] )==0:
+                        break
+                    continue
+                ids = reduce( lambda x,y:x+y,[ q.ids() for q in self.queues.values() ],[] )
+                interval = poll.next( changed,SlurmStatus().next_event(ids) )
+                if self.debug: print(f"Next poll in {interval} seconds")
+                if until is None:
+                    await asyncio.sleep(interval)
+                else:
+                    try:
+                        await asyncio.wait_for( until.wait(),interval )
+                        break
+                    except asyncio.TimeoutError:
+                        pass
+            await finished.join()
+            for t in tasks: t.cancel()
+            postprocessor.shutdown()
+        def poll_jobs(self):
             #
             # ids of all jobs; ids may be 1 if not started, or valid but already finished
             #
             ids = reduce( lambda x,y:x+y,
-                          [ q.ids() for q in self.queues.values() ] )
-            id_string = ",".join( ids )
-            if self.debug: print("Getting status for",id_string)
+                          [ q.ids() for q in self.queues.values() ], [] )
+            if self.debug: print("Getting status for",len(ids),"jobs")
             #
             # get the status for all jobs. some of them may not yet be running, or finished
             #
-            p = sp.Popen(["squeue","-j",id_string,"-h","-o","%A %t"],stdout=sp.PIPE)
-            status_dict = { id:"NS" for id in ids }; running = []; pending = []
-            for status in io.TextIOWrapper(p.stdout, encoding="utf-8"):
-                id,stat = status.strip().split()
+            slurm_status = SlurmStatus().query()
+            status_dict = {}; running = []; pending = []
+            for id in ids:
+                stat = slurm_status.get(id,"NS")
                 if self.debug: print("Job {} status {}".format(id,stat))
                 status_dict[id] = stat
                 if stat=="R":
                     running.append(id)
                 elif stat=="PD":
                     pending.append(id)
+            previous = [ j.status for q in self.queues.values() for j in q.jobs ]
+            finished = []
+            ## jobs submitted since the ids were collected are in slurm_status as pending,
+            ## and if they are not, they can not be taken as finished
+            known = set(ids)
             for q in self.queues.values():
-                q.status_update(status_dict)
-            nrunning = len(running); npending = len(pending)
+                finished += q.status_update(slurm_status,known)
+            changed = previous!=[ j.status for q in self.queues.values() for j in q.jobs ]
             ntogo = sum( [ q.how_many_unfinished() for q in self.queues.values() ] )
             print("Jobs unfinished: {}, running: {}, pending in queue: {}".\
                   format(ntogo,len(running),len(pending)))
-            return ntogo
+            return finished,changed,ntogo
+        def submit_pending(self):
+            for q in self.queues.values():
+                q.submit_pending()
+        def usage(self):
+            return "Node-hours requested: "+", ".join\
+                ( [ f"{q.name}={q.spent:.1f}"+( f"/{q.budget:g}" if q.budget is not None else "" )
+                    +( f" ({q.skipped} skipped)" if q.skipped>0 else "" )
+                    +( f" ({q.failed} failed to submit)" if q.failed>0 else "" )
+                    for q in self.queues.values() ] )
+        def has_unsubmitted(self):
+            return any( [ q.has_unsubmitted() for q in self.queues.values() ] )
+        def update_jobs_status(self):
+            ## synchronous variant: post-process finished jobs, then fill queues
+            finished,_,_ = self.poll_jobs()
+            for j in finished:
+                j.postprocess()
+            self.submit_pending()
+            return sum( [ q.how_many_unfinished() for q in self.queues.values() ] )
     def __new__(cls):
       if not Queues.instance:
         Queues.instance = Queues.__queues()
@@ -620,16 +1953,22 @@ class Queues():
 class TestSuite():
   def __init__(self,suite_spec,configuration):
 
-    self.logfile        = SpawnFiles().get("logfile")
+    ## planning only: no files, no environment changes, no output
+    self.planning       = configuration.get("plan",False)
+    self.logfile        = None if self.planning else SpawnFiles().get("logfile")
     self.starttime      = configuration.get("date","00-00-00")
 
     self.name = configuration.pop("name","testsuite")
     self.regression = configuration.get( "regression",False )
     if self.regression in ["none", "None"]:
       self.regression = None
+    elif self.regression:
+      ## a malformed regression stops the run here, not in the postprocessing of every job
+      regression_test_dict(self.regression)
 
     env = configuration.get("env",[])
     for e in env:
+      if self.planning: break
       name,value = e.split(" ",1)
       print(f"Setting environment variable <<{name}>> to <<{value}>>")
       os.environ[name] = value
@@ -637,17 +1976,41 @@ class TestSuite():
     self.configuration = configuration
     self.testing = self.configuration.get( "testing",False )
     self.modules = self.configuration.get( "modules",None )
-    print(f"Test suite with modules {self.modules}")
+    self.scaling = self.configuration.get( "scaling",None )
+    if self.scaling in ["none", "None"]:
+      self.scaling = None
+    self.repeat = repeat_options( self.configuration.get( "repeat","1" ) )
+    if self.repeat["ci"] is not None and not self.regression:
+      raise Exception("Adaptive repetition needs a regression value")
+    self.submission = self.configuration.get( "submission","single" )
+    if self.submission not in [ "single","array","pack" ]:
+      raise Exception(f"Unknown submission mode: {self.submission}")
+    if not self.planning:
+      print(f"Test suite with modules {self.modules}")
 
-    self.nodes_cores_threads = nodes_cores_threads_values(self.configuration)
-    self.suites = [ parse_suite( suite_spec ) ]
-    print("{}".format(str(self)))
+    self.space = ParameterSpace(self.configuration)
+    self.suites = [ parse_suite( suite_spec,quiet=self.planning ) ]
+    self.jobs = []; self.regressionfiles = []; self.repetitions = []
+    self.submitting = False
+    self.resume = self.configuration.get( "resume",False )
+    self.incremental = self.configuration.get( "incremental",False )
+    if not self.planning:
+      print("{}".format(str(self)))
+  def suite_name(self):
+    return self.suites[-1]["name"]
+  def dependencies(self):
+    ## suites named in `after:' options
+    after = self.suites[-1].get("after",None)
+    if after: return after.split(",")
+    else: return []
+  def is_finished(self):
+    return all( [ j.processed for j in self.jobs ] )
   def __str__(self):
     description = f"""
 ################################################################
 Test suite: {self.name}
 modules: {self.modules}
-nodes/cores/threads: {self.nodes_cores_threads}
+parameter space: {self.space}
 regression: {self.regression}
 suites: {self.suites}
 ################################################################
@@ -662,15 +2025,84 @@ suites: {self.suites}
       print(msg)
       self.logfile.write(msg+"\n")
   def run(self,**kwargs):
+      if not kwargs.get("submit",True) and not kwargs.get("testing",False):
+          ## files only: there are no jobs to wait for or finish
+          self.generate_scripts(); return
+      self.generate_jobs(**kwargs)
+      if kwargs.get("submit",True):
+          Queues().wait_for_jobs()
+      self.finish(**kwargs)
+  def job_specs(self,suite,outputdir,submit):
+      #
+      # benchmark, parameter point, job name, repetitions of all jobs of a suite;
+      # repetitions of all configurations are created in random order
+      #
+      specs = ( (benchmark,point,f"{suite['name']}-{benchmark}-{point['nodes']}-{point['ppn']}"
+                                  +f"-{point['threads']}{point['variant']}")
+                for benchmark in suite["apps"] for point in self.space.points() )
+      if not self.repeat["repeating"]:
+          for benchmark,point,name in specs:
+              yield benchmark,point,name,None
+          return
+      runs = []
+      for benchmark,point,name in specs:
+          rset = Repetitions(self,name,self.repeat,(suite,benchmark,point))
+          self.repetitions.append(rset)
+          count = self.repeat["count"]
+          def recorded(k):
+              ## extra repetitions of an adaptive run: in the journal when resuming,
+              ## as output files in regression mode
+              if self.resume: return Journal().state(f"{name}-r{k}") is not None
+              return not submit and os.path.exists(f"{outputdir}/{name}-r{k}.out")
+          while count<self.repeat["max"] and recorded(count):
+              count += 1
+          runs += [ (benchmark,point,rset) for k in range(count) ]
+      random.Random(self.repeat["seed"]).shuffle(runs)
+      for benchmark,point,rset in runs:
+          ## repetition numbers follow creation order
+          yield benchmark,point,f"{rset.name}-r{len(rset.jobs)}",rset
+  def plan(self):
+      ## jobs and node-hours of this suite, computed from the parameter points only
+      suite = self.suites[-1]
+      hours = ( slurm_seconds(self.configuration["time"]) or 0 )/3600
+      return suite_plan( suite["name"],self.configuration["queue"],len(suite["apps"]),
+                         self.space.points(),hours,self.submission,
+                         self.repeat["count"],self.repeat["max"] )
+  def make_job(self,suite,benchmark,point,unique_name,global_regression_handle,
+               array=None,repetitions=None):
+      job = Job(self.configuration,
+                program_name=benchmark,unique_name=unique_name,suitename=suite["name"],
+                outputdir=self.outputdir,
+                nodes=point["nodes"],ppn=point["ppn"],threads=point["threads"],
+                environment=point["env"],args=point["args"],variant=point["variant"],
+                programdir=suite["dir"],
+                modules=point["modules"] or self.modules,
+                regression=self.regression,global_regression_handle=global_regression_handle,
+                runner=suite["runner"],
+                macros=self.configuration,
+                count=len(self.jobs)+1,trace=True,array=array,repetitions=repetitions,
+              )
+      if repetitions: repetitions.jobs.append(job)
+      self.jobs.append(job)
+      return job
+  def add_repetition(self,rset):
+      ## adaptive repetition: one more run of a configuration, requested by post-processing
+      suite,benchmark,point = rset.spec
+      job = self.make_job(suite,benchmark,point,f"{rset.name}-r{len(rset.jobs)}",
+                          rset.jobs[0].global_regression_handle,repetitions=rset)
+      self.tracemsg(f"Adding repetition <<{job.unique_name}>>")
+      if self.submitting:
+          Queues().enqueue(job)
+  def generate_jobs(self,**kwargs):
+      ## create all jobs, and either enqueue them, or do their regression
       testing = kwargs.get("testing",False)
       debug = kwargs.get("debug",False)
       submit = kwargs.get("submit",True)
+      self.submitting = submit
 
-      count = 1
-      jobs = []; jobids = []
       ## for now all output goes in the same directory
-      outputdir = SpawnFiles().ensurefiledir(subdir="output")
-      jobnames = []; regressionfiles = []
+      outputdir = self.outputdir = SpawnFiles().ensurefiledir(subdir="output")
+      jobnames = set(); arrays = {}; regression_jobs = []; nresumed = 0; nreused = 0
       ## iterate over suites
       ## I think this only does one iteration.
       for suite in self.suites:
@@ -678,94 +2110,270 @@ suites: {self.suites}
           print(f"Suitename: {suitename}")
           regressionfilename = f"regression-{suitename}.txt"
           if self.regression:
-              global_regression_handle,_,_,k = SpawnFiles().open_new( f"{regressionfilename}" )
+              global_regression_handle,_,_,k \
+                  = SpawnFiles().open_new( f"{regressionfilename}",append=self.resume )
+              self.regressionfiles.append(k)
           else: global_regression_handle = None
           self.tracemsg(f"Test suite {self.name} run at {self.starttime}")
           self.logfile.write(str(self))
-          for benchmark in suite["apps"]:
-              self.tracemsg("="*16+"\n"+f"{count}: submitting suite=<<{suitename}>> benchmark=<<{benchmark}>>")
-              for nodes,ppn,threads in self.nodes_cores_threads:
-                self.tracemsg(f" .. N={nodes} ppn={ppn} threads={threads}")
-                unique_name = f"{suitename}-{benchmark}-{nodes}-{ppn}-{threads}"
+          current = None
+          for benchmark,point,unique_name,rset in self.job_specs(suite,outputdir,submit):
+                if benchmark!=current:
+                    self.tracemsg("="*16+"\n"+f"{len(self.jobs)+1}: submitting suite=<<{suitename}>> benchmark=<<{benchmark}>>")
+                    current = benchmark
+                nodes = point["nodes"]
+                modules = point["modules"] or self.modules
+                self.tracemsg(f" .. N={nodes} ppn={point['ppn']} threads={point['threads']}"
+                              +point["variant"]+( f" repetition {len(rset.jobs)}" if rset else "" ))
                 if unique_name in jobnames:
                     raise Exception(f"Job name conflict: {unique_name}")
                 else:
-                    jobnames.append(unique_name)
-                job = Job(self.configuration,
-                          program_name=benchmark,unique_name=unique_name,
-                          outputdir=outputdir,
-                          nodes=nodes,ppn=ppn,threads=threads,
-                          programdir=suite["dir"],
-                          modules=self.modules,
-                          regression=self.regression,global_regression_handle=global_regression_handle,
-                          runner=suite["runner"],
-                          macros=self.configuration,
-                          count=count,trace=True,
-                        )
+                    jobnames.add(unique_name)
+                array = None
+                if submit and self.submission=="array":
+                    ## one array per node count, modules and environment
+                    queue = self.configuration["queue"]
+                    group = ( queue,nodes,modules,tuple( point["env"].items() ) )
+                    if group not in arrays.keys():
+                        arrayname = f"{suitename}-N{nodes}"
+                        if any( [ a.name==arrayname for a in arrays.values() ] ):
+                            arrayname += f"-{len(arrays)}"
+                        arrays[group] = JobArray(arrayname,queue,nodes)
+                    array = arrays[group]
+                elif submit and self.submission=="pack":
+                    ## one allocation per ppn and modules
+                    queue = self.configuration["queue"]; ppn = point["ppn"]
+                    group = ( queue,ppn,modules )
+                    if group not in arrays.keys():
+                        packname = f"{suitename}-pack"
+                        if len(arrays)>0: packname += f"-ppn{ppn}-{len(arrays)}"
+                        arrays[group] = JobPack(packname,queue,ppn)
+                    array = arrays[group]
+                job = self.make_job(suite,benchmark,point,unique_name,global_regression_handle,
+                                    array=array,repetitions=rset)
+                if ( state := Journal().state(unique_name) ) and job.restore(state):
+                    nresumed += 1
+                    ## an array is submitted as a whole
+                    if array and not array.jobid: array.jobid = job.jobid.split("_")[0]
+                    if job.processed: continue
+                elif submit and self.regression:
+                    job.cache_key = job.content_key()
+                    if self.incremental and ( cached := ResultsStore().cache_lookup(job.cache_key) ) \
+                       and job.reuse(cached):
+                        nreused += 1
+                        if array: array.jobs.remove(job)
+                        continue
+                    job.journal()
+                else: job.journal()
                 if submit:
-                    Queues().enqueue(job)
+                    ## array elements are enqueued once the array is complete
+                    if not array: Queues().enqueue(job)
                 elif job.regression:
-                    regression_key = job.do_regression()
-                    regressionfiles.append( regression_key )
-                count += 1
-      if submit:
-          Queues().wait_for_jobs()
+                    regression_jobs.append(job)
+      if nresumed>0:
+          self.tracemsg(f"Resumed {nresumed} jobs from the journal,"
+                        +f" {len(self.jobs)-nresumed} jobs to be submitted")
+      if self.incremental:
+          self.tracemsg(f"Reused {nreused} results of identical earlier jobs")
+      if len(regression_jobs)>0:
+          self.regression_all(regression_jobs)
+          for rset in self.repetitions:
+              rset.complete = True; rset.summarize()
+      for array in arrays.values():
+          if len(array.jobs)==0: continue
+          array.write_script()
+          for job in array.jobs:
+              Queues().enqueue(job)
+  def generate_scripts(self):
+      ## files-only mode: render all job scripts from one compiled template,
+      ## without creating Job objects, and list them in a manifest
+      starttime = time.time()
+      for key in [ "account","queue","sbatch","time" ]:
+          if key not in self.configuration:
+              print(f"\nConfiguration does not have required key <<{key}>>\n")
+              sys.exit(1)
+      outputdir = SpawnFiles().ensurefiledir(subdir="output")
+      scriptdir = SpawnFiles().ensurefiledir(subdir="scripts")
+      manifest,mdir,mfile,_ = SpawnFiles().open("manifest.jsonl")
+      template = batch_script_template( tuple(self.configuration["sbatch"]) )
+      profiling = profile_options( self.configuration.get("profile","none") )
+      if profiling: profiledir = os.path.abspath( SpawnFiles().ensurefiledir(subdir="profile") )
+      common = { "queue":self.configuration["queue"],"time":self.configuration["time"],
+                 "account":self.configuration["account"],
+                 "outputdir":outputdir,"profiler":profiler(profiling) }
+      jobnames = set(); records = []; log = []
+      for suite in self.suites:
+          suitename = suite["name"]
+          common.update( { "programdir":suite["dir"],"runner":suite["runner"] } )
+          for benchmark in suite["apps"]:
+              for point,repetition in ( (p,k) for p in self.space.points()
+                                        for k in range(self.repeat["count"]) ):
+                  nodes,ppn,threads = point["nodes"],point["ppn"],point["threads"]
+                  modules = point["modules"] or self.modules
+                  unique_name = f"{suitename}-{benchmark}-{nodes}-{ppn}-{threads}{point['variant']}"
+                  if self.repeat["repeating"]: unique_name += f"-r{repetition}"
+                  if unique_name in jobnames:
+                      raise Exception(f"Job name conflict: {unique_name}")
+                  jobnames.add(unique_name)
+                  output = f"{outputdir}/{unique_name}.out"
+                  script = f"{scriptdir}/{unique_name}.script"
+                  values = dict( common,unique_name=unique_name,output=output,
+                                 nodes=nodes,ppn=ppn,thread_spec=thread_spec(threads),
+                                 module_spec=modules_spec(modules),env_spec=env_spec(point["env"]),
+                                 profile_spec=profile_spec(profiling,f"{profiledir}/{unique_name}")
+                                   if profiling else "",
+                                 program_args=f" {point['args']}" if point["args"] else "",
+                                 program_name=benchmark )
+                  with open(script,"w") as handle:
+                      handle.write( MacroScope(values).resolve(template)+"\n" )
+                  records.append( json.dumps( {
+                      "name":unique_name,"suite":suitename,"benchmark":benchmark,
+                      "nodes":nodes,"ppn":ppn,"threads":threads,"modules":modules,
+                      "env":point["env"],"args":point["args"],
+                      "queue":common["queue"],"time":common["time"],
+                      "script":script,"output":output } ) )
+                  log.append(f"{len(records):3}: script={script}\n")
+      manifest.write( "".join( [ r+"\n" for r in records ] ) )
+      manifest.flush()
+      self.logfile.write( "".join(log) )
+      elapsed = max( time.time()-starttime,1.e-6 )
+      self.tracemsg(f"Generated {len(records)} scripts in {elapsed:.2f} sec:"
+                    +f" {len(records)/elapsed:.1f} scripts/s, manifest in {mdir}/{mfile}")
+  def regression_all(self,jobs):
+      ## regression on existing output: extraction fans out over a process pool,
+      ## then the results are written in job order
+      starttime = time.time()
+      tasks = [ (j.slurm_output_file_name,j.regression) for j in jobs ]
+      nworkers = int( self.configuration.get("regressionworkers",os.cpu_count() or 1) )
+      if nworkers>1 and len(tasks)>1:
+          chunksize = max( 1,len(tasks)//(4*nworkers) )
+          with concurrent.futures.ProcessPoolExecutor(max_workers=nworkers) as pool:
+              results = list( pool.map(regression_worker,tasks,chunksize=chunksize) )
       else:
-          SpawnFiles().close_files( regressionfiles )
+          results = [ regression_worker(t) for t in tasks ]
+      nbytes = 0
+      for job,(extracted,size,error) in zip(jobs,results):
+          if error: print(f"Could not open file for regression: <<{error}>>")
+          nbytes += size
+          job.do_regression(extracted=extracted,scanned=True)
+      elapsed = max( time.time()-starttime,1.e-6 )
+      self.tracemsg(f"Regression on {len(jobs)} files, {nbytes/1.e6:.1f} MB in {elapsed:.2f} sec:"
+                    +f" {len(jobs)/elapsed:.1f} files/s, {nbytes/1.e6/elapsed:.1f} MB/s")
+  def finish(self,**kwargs):
+      ## after all jobs have finished: close files, record, compare regressions
+      SpawnFiles().close_files( self.regressionfiles )
+      ## a test run with no output to regress on leaves no trace in the results database
+      if self.regression and any( [ j.result and j.result["samples"]>0 for j in self.jobs ] ):
+          ResultsStore().add_suite\
+              ( { "campaign":self.configuration.get("date",None),
+                  "system":self.configuration.get("system",None),
+                  "suite":self.suite_name(),"outputdir":os.path.abspath(SpawnFiles().outputdir),
+                  "regression":self.regression,"njobs":len(self.jobs) } )
+      if self.regression and self.scaling:
+          self.scaling_report()
+      if kwargs.get("submit",True) and not kwargs.get("testing",False):
+          self.timeline_report()
       if cdir := self.configuration["comparedir"]:
           print("All jobs finished, only regression comparison left to do")
           cdir = cdir+"/regression"
           odir = self.configuration["outputdir"]+"/regression"
           if self.regression: ## we can have both regression and none in the same job
-              comparefile = self.regression_compare(suitename,cdir,odir)
-          print( f" .. comparison output in {comparefile}" )
+              comparefile = self.regression_compare(self.suite_name(),cdir,odir)
+              print( f" .. comparison output in {comparefile}" )
+  def scaling_report(self):
+      ## scaling analysis of the regression values of this suite
+      options = scaling_options(self.scaling)
+      values = {}
+      for j in self.jobs:
+          if j.result and j.result["number"] is not None:
+              values.setdefault( (j.program_name+j.variant,j.nodes,j.ppn,j.threads),[] )\
+                    .append( j.result["number"] )
+      ## repetitions of a configuration are averaged
+      results = [ { "benchmark":b,"nodes":n,"ppn":p,"threads":t,"value":statistics.mean(v) }
+                  for (b,n,p,t),v in values.items() ]
+      if len(results)==0:
+          self.tracemsg(f"No numerical results for scaling analysis"); return
+      analysis = scaling_analysis(results,options)
+      suitename = self.suite_name()
+      for extension,contents in [ ("tsv",scaling_table(analysis)),
+                                  ("txt",scaling_summary(analysis,options,suitename)) ]:
+          handle,sdir,sfile,skey = SpawnFiles().open_new(f"scaling-{suitename}.{extension}")
+          handle.write(contents)
+          SpawnFiles().close_files( [skey] )
+      self.tracemsg(f"Scaling analysis in {sdir}/scaling-{suitename}.txt")
+  def timeline_records(self):
+      #
+      # submit, start, end, exit code, nodes, energy of every job that ran in this campaign,
+      # from sacct in bulk; without accounting, from what the status polling saw
+      #
+      jobs = [ j for j in self.jobs if j.jobid!="1" and not j.reused ]
+      ## one id per array; its elements come back individually
+      accounting = SlurmStatus().accounting( [ j.array.jobid if j.array else j.jobid for j in jobs ] )
+      records = []
+      for j in jobs:
+          if j.jobid in accounting.keys():
+              record = dict( accounting[j.jobid] )
+          else:
+              record = { "jobid":j.jobid,"exitcode":None,"state":None,"energy":None,
+                         "queue":j.queue,"nodes":j.allocation()[0],**j.times }
+          record["name"] = j.unique_name
+          j.timeline = add_intervals(record)
+          records.append(record)
+      return records,"sacct" if len(accounting)>0 else "status polling"
+  def timeline_report(self):
+      ## Gantt table and campaign metrics: makespan, throughput, queue waits
+      records,source = self.timeline_records()
+      if len(records)==0: return
+      metrics = campaign_metrics(records)
+      suitename = self.suite_name()
+      for extension,contents in [ ("tsv",timeline_table(records,metrics["start"])),
+                                  ("txt",timeline_summary(metrics,f"suite {suitename}",source)) ]:
+          handle,tdir,tfile,tkey = SpawnFiles().open_new(f"timeline-{suitename}.{extension}")
+          handle.write(contents)
+          SpawnFiles().close_files( [tkey] )
+      self.tracemsg(f"Timeline in {tdir}/timeline-{suitename}.txt")
   def regression_compare(self,suitename,cdir,odir):
         rtest = regression_test_dict( self.regression )
         comparison,comp_dir,comp_fil,comp_key \
           = SpawnFiles().open_new(f"regression_compare-{suitename}")
         comparison_path = comp_dir+"/"+comp_fil
-        majorly_off = []; within_margin = 0;
-        for ofile in [ f for f in os.listdir(odir) 
-                       if os.path.isfile( os.path.join( odir,f ) ) ]:
-            opath = os.path.join( odir,ofile )
-            SpawnFiles().close_by_path(opath)
-            cpath = os.path.join( cdir,ofile )
-            if os.path.isfile( cpath ):
-                comparison.write(f"Comparing: output={opath} compare={cpath}\n")
-                with open( opath,"r" ) as ohandle:
-                    oline = ohandle.readline().strip()
-                with open( cpath,"r" ) as chandle:
-                    cline = chandle.readline().strip()
-                dev = ""
-                if "margin" in rtest.keys():
-                    margin = rtest["margin"]
-                    violate = False
-                    if perc := re.match(r'([0-9]+)p.*',margin):
-                        dev = float( perc.groups()[0] )/100
-                        try :
-                            oval = float( oline ); cval = float( cline )
-                            violate_more = (oval-cval)/cval>dev
-                            violate_less = (cval-oval)/oval>dev
-                            violate = violate_more or violate_less
-                            if violate_less:
-                                dev = f", outside {dev} margin: less"
-                            elif violate_more:
-                                dev = f", outside {dev} margin: more"
-                            else:
-                                dev = f", inside {dev} margin"
-                                within_margin += 1
-                        except:
-                            dev = f", margin comparison failed"
-                    report = f"Output: {oline}, compare: {cline}{dev}"
-                    if violate: majorly_off.append( f"{opath} {report}" )
-                else: report = f"Output: {oline}, compare: {cline}"
-                comparison.write( f"{report}\n" )
+        ## individual runs, and the means of repeated runs
+        names = set( [ j.unique_name for j in self.jobs ]+[ r.name for r in self.repetitions ] ) \
+            if len(self.jobs)>0 else None
+        oresults = load_regression_results(odir,names)
+        cresults = load_regression_results(cdir,names)
+        margin = rtest.get("margin",None)
+        rows = compare_rows( comparison_rows(oresults,cresults),margin )
+        comparison.write(f"Comparing: output={odir} compare={cdir} margin={margin}\n")
+        for name in sorted( set(oresults.keys())-set(cresults.keys()) ):
+            comparison.write(f"{name}: no result in compare directory\n")
+        for name in sorted( set(cresults.keys())-set(oresults.keys()) ):
+            comparison.write(f"{name}: no result in output directory\n")
+        within_margin = 0; majorly_off = []; failed = 0
+        for r in rows:
+            report = f"{r['name']} {r['metric']}: output {r['otext']}, compare {r['ctext']}"
+            if r["delta"] is None:
+                report += ", not a number"; failed += 1
+            else:
+                report += f", delta {r['delta']:+.4g}"
+                if math.isfinite(r["relative"]): report += f" ({100*r['relative']:+.1f}%)"
+            if r["severity"] is not None:
+                if r["severity"]>1:
+                    direction = "more" if r["delta"]>0 else "less"
+                    report += f", outside margin: {direction}"
+                    majorly_off.append( (r["severity"],report) )
+                else:
+                    report += ", inside margin"
+                    within_margin += 1
+            comparison.write( f"{report}\n" )
+        comparison.write( f"================ Compared: {len(rows)} values from {len(oresults)} results ================\n" )
+        if failed>0:
+            comparison.write( f"================ Comparison failed, not a number: {failed} ================\n" )
         if within_margin>0:
             comparison.write( f"================ Tests within margin: {within_margin} ================\n" )
         if len(majorly_off)>0:
-            comparison.write( f"================ Major violations: {len(majorly_off)} ================\n" )
-            for m in majorly_off:
-                comparison.write( m+"\n" )
+            comparison.write( f"================ Major violations: {len(majorly_off)}, by severity ================\n" )
+            for severity,m in sorted( majorly_off,key=lambda sm:-sm[0] ):
+                comparison.write( f"{severity:8.2f} {m}\n" )
         SpawnFiles().close_files( [comp_key] ) ## comparison.close()
-        #print( f" .. comparison in <<{comparison_path}>>" )
         return comparison_path
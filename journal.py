@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#
+# Demonspawn
+# a utility for quickly generating a slew of batch jobs
+# good for benchmarking, regression testing, and such
+#
+# Victor Eijkhout
+# copyright 2020-2022
+#
+# version 0.5, see the Readme for details
+#
+# journal.py : append-only record of job states, for resuming a campaign
+#
+
+import json
+import os
+import threading
+import time
+
+##
+## every state change of every job is appended to a journal in the output directory,
+## so that a killed or crashed run can be resumed without resubmitting jobs
+## this is a singleton class
+##
+class Journal():
+  instance = None
+  class __journal():
+    def __init__(self):
+      self.path = None; self.handle = None
+      self.states = {}
+      ## flushed on every record, synced to disk at most this often
+      self.sync_interval = 1.; self.last_sync = 0.
+      self.lock = threading.Lock()
+    def open(self,outputdir,resume=False):
+      self.path = f"{outputdir}/journal.jsonl"
+      if resume:
+        self.states = self.load(self.path)
+        print(f"Resuming from journal <<{self.path}>> with {len(self.states)} jobs")
+      self.handle = open(self.path,"a")
+    def load(self,path):
+      ## last recorded state of each job; a line cut off by a crash is skipped
+      states = {}
+      if not os.path.exists(path): return states
+      with open(path,"r") as journal:
+        for line in journal:
+          try:
+            record = json.loads(line)
+          except json.JSONDecodeError:
+            continue
+          states[ record["name"] ] = record
+      return states
+    def state(self,name):
+      return self.states.get(name,None)
+    def record(self,name,**fields):
+      if self.handle is None: return
+      record = dict( name=name,time=time.time(),**fields )
+      with self.lock:
+        self.handle.write( json.dumps(record)+"\n" )
+        self.handle.flush()
+        if record["time"]-self.last_sync>self.sync_interval:
+          os.fsync( self.handle.fileno() ); self.last_sync = record["time"]
+    def close(self):
+      with self.lock:
+        if self.handle:
+          self.handle.flush(); os.fsync( self.handle.fileno() )
+          self.handle.close(); self.handle = None
+  def __new__(cls):
+    if not Journal.instance:
+      Journal.instance = Journal.__journal()
+    return Journal.instance
+  def __getattr__(self,attr):
+    return self.instance.__getattr__(attr)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#
+# Demonspawn
+# a utility for quickly generating a slew of batch jobs
+# good for benchmarking, regression testing, and such
+#
+# Victor Eijkhout
+# copyright 2020-2022
+#
+# version 0.5, see the Readme for details
+#
+# plan.py : what a configuration will submit, and what it will cost
+#
+
+from collections import Counter
+
+def pack_waves(nodecounts):
+  #
+  # number of waves of a pack, as in JobPack.waves: jobs are placed first-fit, largest first,
+  # in an allocation of the largest node count; nodecounts is a Counter of node counts.
+  # Jobs of the same size go in bulk: first fit fills a wave before it moves on.
+  #
+  if len(nodecounts)==0: return 0
+  sizes = sorted( nodecounts.keys(),reverse=True )
+  size = sizes[0]; smallest = sizes[-1]
+  ## room left in each wave, in order, of the waves where the smallest jobs still fit
+  room = []; nwaves = 0
+  for n in sizes:
+    left = nodecounts[n]
+    for w in range(len(room)):
+      if left==0: break
+      if room[w]>=n:
+        fit = min( left,room[w]//n )
+        room[w] -= fit*n; left -= fit
+    per_wave = size//n
+    while left>0:
+      fit = min(left,per_wave)
+      room.append( size-fit*n ); left -= fit; nwaves += 1
+    room = [ r for r in room if r>=smallest ]
+  return nwaves
+
+def suite_plan(name,queue,napps,points,hours,submission,count,most):
+  #
+  # jobs, slurm jobs, and node-hours of one suite, from its parameter points;
+  # every point is run for each of `napps' programs, `count' times, adaptively up to `most'
+  #
+  nodes = Counter(); groups = {}
+  for p in points:
+    n = int(p["nodes"]); nodes[n] += 1
+    ## the grouping of generate_jobs
+    if submission=="array":
+      key = ( n,p["modules"],tuple( p["env"].items() ) )
+    elif submission=="pack":
+      key = ( p["ppn"],p["modules"] )
+    else: continue
+    groups.setdefault( key,Counter() )[n] += 1
+  def nodehours(repeat):
+    if submission=="pack":
+      ## each pack holds its largest node count for all of its waves
+      return sum( [ max( g.keys() )*pack_waves( Counter( { n:c*napps*repeat for n,c in g.items() } ) )
+                    for g in groups.values() ] )*hours
+    return sum( [ n*c for n,c in nodes.items() ] )*napps*repeat*hours
+  njobs = sum( nodes.values() )*napps
+  return { "suite":name,"queue":queue,"submission":submission,
+           "jobs":njobs*count,
+           "slurmjobs":njobs*count if submission=="single" else len(groups),
+           "nodehours":nodehours(count),
+           "maxjobs":njobs*most,"maxnodehours":nodehours(most) }
+
+def plan_summary(plans,name,budgets):
+  #
+  # table of jobs and node-hours per suite and per queue;
+  # budgets: node-hour budget of each queue that has one
+  #
+  header = f"{'':16} {'queue':12} {'submission':10} {'jobs':>9} {'slurm jobs':>10} {'node-hours':>12}"
+  lines = [ f"Plan of {name}: {sum( [ p['jobs'] for p in plans ] )} jobs in {len(plans)} suites,"
+            +f" {sum( [ p['nodehours'] for p in plans ] ):.6g} node-hours requested",
+            "",f"{'suite':16}"+header[16:] ]
+  queues = {}
+  for p in plans:
+    lines.append( f"{p['suite']:16} {p['queue']:12} {p['submission']:10} {p['jobs']:9} "
+                  +f"{p['slurmjobs']:10} {p['nodehours']:12.6g}" )
+    if p["maxjobs"]>p["jobs"]:
+      lines.append( f"{'':16} {'':12} {'adaptive':10} {p['maxjobs']:9} {'at most':>10}"
+                    +f" {p['maxnodehours']:12.6g}" )
+    q = queues.setdefault( p["queue"],{ "jobs":0,"slurmjobs":0,"nodehours":0. } )
+    for k in q.keys(): q[k] += p[k]
+  lines += [ "",f"{'queue':12} {'jobs':>9} {'slurm jobs':>10} {'node-hours':>12} {'budget':>10}" ]
+  for qname,q in queues.items():
+    line = f"{qname:12} {q['jobs']:9} {q['slurmjobs']:10} {q['nodehours']:12.6g}"
+    if ( budget := budgets.get(qname,None) ) is not None:
+      line += f" {budget:10.6g}"
+      if q["nodehours"]>budget: line += " exceeded"
+    lines.append(line)
+  return "\n".join(lines)+"\n"
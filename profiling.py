@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#
+# Demonspawn
+# a utility for quickly generating a slew of batch jobs
+# good for benchmarking, regression testing, and such
+#
+# Victor Eijkhout
+# copyright 2020-2022
+#
+# version 0.5, see the Readme for details
+#
+# profiling.py : wall time, cpu time, memory of every rank of a job
+#
+
+from functools import lru_cache
+import glob
+import re
+
+@lru_cache(maxsize=None)
+def profile_options(spec):
+  ## `profile time per:node topology maxrss:4G walltime:10m' -> dict, None for no profiling
+  words = spec.split()
+  if len(words)==0 or words[0] in [ "none","None" ]:
+    return None
+  if words[0]!="time":
+    raise Exception(f"Unknown profiler: <<{words[0]}>>, use time or none")
+  options = { "per":"rank","topology":False,"limits":{} }
+  for w in words[1:]:
+    if w=="topology":
+      options["topology"] = True
+    elif re.match("per:",w):
+      options["per"] = w.split(":",1)[1]
+      if options["per"] not in [ "rank","node" ]:
+        raise Exception(f"Profile per rank or per node, not: <<{w}>>")
+    elif re.match("maxrss:",w):
+      options["limits"]["maxrss"] = memory_kbytes( w.split(":",1)[1] )
+    elif re.match("walltime:",w):
+      options["limits"]["walltime"] = duration_seconds( w.split(":",1)[1] )
+    else:
+      raise Exception(f"Unknown profile option: <<{w}>>")
+  return options
+
+def memory_kbytes(spec):
+  ## `4G' -> kilobytes
+  if not ( m := re.match(r'^([0-9.]+)([kKmMgGtT]?)$',spec) ):
+    raise Exception(f"Not a memory size: <<{spec}>>")
+  number,unit = m.groups()
+  return float(number)*{ "":1,"k":1,"m":1024,"g":1024**2,"t":1024**3 }[unit.lower()]
+
+def duration_seconds(spec):
+  ## `90', `90s', `10m', `2h' -> seconds
+  if not ( m := re.match(r'^([0-9.]+)([smh]?)$',spec) ):
+    raise Exception(f"Not a duration: <<{spec}>>")
+  number,unit = m.groups()
+  return float(number)*{ "":1,"s":1,"m":60,"h":3600 }[unit]
+
+##
+## the wrapper runs one rank under /usr/bin/time, or else under python's resource accounting,
+## and writes the measurements to $DEMONSPAWN_PROFILE.<rank>
+##
+python_timer = """
+import resource,subprocess,sys,time
+start = time.time()
+status = subprocess.call(sys.argv[2:])
+wall = time.time()-start
+usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+with open(sys.argv[1],"w") as out:
+  out.write(f"\\tUser time (seconds): {usage.ru_utime:.2f}\\n")
+  out.write(f"\\tSystem time (seconds): {usage.ru_stime:.2f}\\n")
+  out.write(f"\\tElapsed (wall clock) time (h:mm:ss or m:ss): {int(wall//60)}:{wall%60:05.2f}\\n")
+  out.write(f"\\tMaximum resident set size (kbytes): {usage.ru_maxrss}\\n")
+  out.write(f"\\tExit status: {status}\\n")
+sys.exit(status)
+"""
+
+def wrapper_script(per):
+  other_ranks = """
+if [ "${SLURM_LOCALID:-${MPI_LOCALRANKID:-${OMPI_COMM_WORLD_LOCAL_RANK:-0}}}" != "0" ] ; then
+  exec "$@"
+fi""" if per=="node" else ""
+  return \
+f"""#!/bin/bash
+## profile one rank of a demonspawn job: wall time, cpu time, maximum resident set size
+rank=${{SLURM_PROCID:-${{PMI_RANK:-${{OMPI_COMM_WORLD_RANK:-0}}}}}}{other_ranks}
+if [ -z "$DEMONSPAWN_PROFILE" ] ; then
+  exec "$@"
+elif [ -x /usr/bin/time ] ; then
+  exec /usr/bin/time -v -o "$DEMONSPAWN_PROFILE.$rank" "$@"
+else
+  exec python3 -c '{python_timer}' "$DEMONSPAWN_PROFILE.$rank" "$@"
+fi
+"""
+
+def profile_spec(options,base):
+  ## job script lines: where the ranks write their profiles, and optionally the topology
+  if options is None: return ""
+  spec = f"## profile per {options['per']}\nexport DEMONSPAWN_PROFILE={base}\n"
+  if options["topology"]:
+    spec += "{ lscpu ; lstopo-no-graphics --of console ; } > $DEMONSPAWN_PROFILE.topology 2>&1\n"
+  return spec
+
+def wall_seconds(spec):
+  ## h:mm:ss or m:ss.ss
+  seconds = 0.
+  for part in spec.split(":"):
+    seconds = 60*seconds+float(part)
+  return seconds
+
+time_fields = [ ("user",r'User time \(seconds\): *([0-9.]+)',float),
+                ("system",r'System time \(seconds\): *([0-9.]+)',float),
+                ("walltime",r'Elapsed \(wall clock\) time.*: *([0-9:.]+)',wall_seconds),
+                ("maxrss",r'Maximum resident set size \(kbytes\): *([0-9]+)',float),
+                ("exit",r'Exit status: *([0-9]+)',int) ]
+
+def parse_time_output(text):
+  ## output of `/usr/bin/time -v' -> dict of the fields that are present
+  rank = {}
+  for key,pattern,convert in time_fields:
+    if m := re.search(pattern,text):
+      rank[key] = convert( m.groups()[0] )
+  return rank
+
+def parse_topology(text):
+  ## a few lscpu fields
+  topology = {}
+  for key,field in [ ("cpus","CPU\\(s\\)"),("sockets","Socket\\(s\\)"),("model","Model name") ]:
+    if m := re.search(f"^{field}: *(.*)$",text,re.MULTILINE):
+      topology[key] = m.groups()[0].strip()
+  return topology
+
+def collect_profile(base):
+  #
+  # combine the per-rank profiles <base>.<rank>:
+  # maximum wall time and memory over the ranks, total cpu time; None if there are none
+  #
+  ranks = []
+  for path in glob.glob( glob.escape(base)+".*" ):
+    if not re.search(r'\.[0-9]+$',path): continue
+    with open(path,"r") as rankfile:
+      if len( rank := parse_time_output( rankfile.read() ) )>0:
+        ranks.append(rank)
+  if len(ranks)==0: return None
+  profile = { "ranks":len(ranks) }
+  for key,combine in [ ("walltime",max),("maxrss",max),("user",sum),("system",sum),("exit",max) ]:
+    values = [ r[key] for r in ranks if key in r.keys() ]
+    if len(values)>0: profile[key] = combine(values)
+  try:
+    with open(base+".topology","r") as topology:
+      profile.update( parse_topology( topology.read() ) )
+  except FileNotFoundError: pass
+  return profile
+
+def profile_line(profile):
+  ## numbers for the regression file; the topology goes in the results database only
+  return " ".join( [ f"{k}={profile[k]:.6g}" for k in [ "ranks","walltime","user","system","maxrss","exit" ]
+                     if k in profile.keys() ] )
+
+def parse_profile_line(line):
+  ## inverse of profile_line
+  profile = {}
+  for item in line.split():
+    k,v = item.split("=",1)
+    profile[k] = float(v)
+  return profile
+
+def profile_violations(profile,limits):
+  ## descriptions of the limits that this profile exceeds
+  violations = []
+  if ( rss := profile.get("maxrss",None) ) is not None and "maxrss" in limits.keys() \
+     and rss>limits["maxrss"]:
+    violations.append( f"maxrss {rss/1024:.1f}M > {limits['maxrss']/1024:.1f}M" )
+  if ( wall := profile.get("walltime",None) ) is not None and "walltime" in limits.keys() \
+     and wall>limits["walltime"]:
+    violations.append( f"walltime {wall:.1f}s > {limits['walltime']:.1f}s" )
+  if profile.get("exit",0)!=0:
+    violations.append( f"exit status {int(profile['exit'])}" )
+  return violations
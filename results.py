@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#
+# Demonspawn
+# a utility for quickly generating a slew of batch jobs
+# good for benchmarking, regression testing, and such
+#
+# Victor Eijkhout
+# copyright 2020-2022
+#
+# version 0.5, see the Readme for details
+#
+# results.py : database of regression results over all runs
+#
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+schema = [
+    """CREATE TABLE IF NOT EXISTS results (
+         id INTEGER PRIMARY KEY,
+         campaign TEXT, timestamp REAL, system TEXT, suite TEXT, benchmark TEXT,
+         nodes INTEGER, ppn INTEGER, threads INTEGER, modules TEXT,
+         unique_name TEXT, jobid TEXT, outputdir TEXT, regression TEXT,
+         value REAL, text TEXT, samples INTEGER, stddev REAL )""",
+    """CREATE INDEX IF NOT EXISTS results_benchmark
+         ON results (benchmark,nodes,timestamp)""",
+    """CREATE INDEX IF NOT EXISTS results_suite
+         ON results (suite,timestamp)""",
+    """CREATE INDEX IF NOT EXISTS results_campaign
+         ON results (campaign,unique_name)""",
+    """CREATE TABLE IF NOT EXISTS curves (
+         result_id INTEGER, x REAL, y REAL )""",
+    """CREATE INDEX IF NOT EXISTS curves_result
+         ON curves (result_id)""",
+    """CREATE TABLE IF NOT EXISTS suites (
+         campaign TEXT, timestamp REAL, system TEXT, suite TEXT,
+         outputdir TEXT, regression TEXT, njobs INTEGER )""",
+    """CREATE TABLE IF NOT EXISTS profiles (
+         campaign TEXT, timestamp REAL, system TEXT, suite TEXT, benchmark TEXT,
+         nodes INTEGER, ppn INTEGER, threads INTEGER, unique_name TEXT, jobid TEXT,
+         ranks INTEGER, walltime REAL, user REAL, system_time REAL, maxrss REAL, exit_status INTEGER,
+         cpus TEXT, sockets TEXT, model TEXT )""",
+    """CREATE INDEX IF NOT EXISTS profiles_benchmark
+         ON profiles (benchmark,nodes,timestamp)""",
+    """CREATE TABLE IF NOT EXISTS cache (
+         key TEXT PRIMARY KEY, unique_name TEXT, jobid TEXT,
+         regression_file TEXT, output_file TEXT, timestamp REAL )""",
+]
+
+## file name of the database in an output directory
+default_name = "demonspawn-results.sqlite"
+
+##
+## one sqlite database collects the regression results of all runs,
+## so that results can be compared across runs without parsing files
+## this is a singleton class
+##
+class ResultsStore():
+  instance = None
+  class __resultsstore():
+    def __init__(self):
+      ## no database until the output directory or `resultsdb' gives a path
+      self.path = None
+      self.connection = None
+      ## results come from the post-processing thread
+      self.lock = threading.Lock()
+      self.uncommitted = 0; self.commit_every = 500
+    def set_path(self,path):
+      if self.connection:
+        raise Exception(f"Results database already open: <<{self.path}>>")
+      self.path = None if path in [ "none","None" ] else path
+    def connect(self):
+      if self.connection is None and self.path:
+        self.connection = sqlite3.connect(self.path,check_same_thread=False)
+        for statement in schema:
+          self.connection.execute(statement)
+      return self.connection
+    def add_result(self,record,curve=None):
+      ## record: dict with the columns of the results table
+      with self.lock:
+        if not ( db := self.connect() ): return None
+        record = dict(record); record.setdefault("timestamp",time.time())
+        columns = ",".join( record.keys() )
+        slots = ",".join( [ "?" for k in record.keys() ] )
+        cursor = db.execute( f"INSERT INTO results ({columns}) VALUES ({slots})",
+                             list(record.values()) )
+        if curve:
+          db.executemany( "INSERT INTO curves (result_id,x,y) VALUES (?,?,?)",
+                          [ (cursor.lastrowid,x,y) for x,y in curve ] )
+        self.uncommitted += 1
+        if self.uncommitted>=self.commit_every:
+          self.commit_locked()
+        return cursor.lastrowid
+    def add_suite(self,record):
+      with self.lock:
+        if not ( db := self.connect() ): return
+        record = dict(record); record.setdefault("timestamp",time.time())
+        columns = ",".join( record.keys() )
+        slots = ",".join( [ "?" for k in record.keys() ] )
+        db.execute( f"INSERT INTO suites ({columns}) VALUES ({slots})",list(record.values()) )
+        self.commit_locked()
+    def add_profile(self,record):
+      ## per-job profile: wall time, cpu times, maximum memory, topology
+      with self.lock:
+        if not ( db := self.connect() ): return
+        record = dict(record); record.setdefault("timestamp",time.time())
+        columns = ",".join( record.keys() )
+        slots = ",".join( [ "?" for k in record.keys() ] )
+        db.execute( f"INSERT INTO profiles ({columns}) VALUES ({slots})",list(record.values()) )
+        self.uncommitted += 1
+    def cache_store(self,key,record):
+      ## successful job under the hash of its inputs, for incremental runs
+      with self.lock:
+        if not ( db := self.connect() ): return
+        record = dict(record); record.setdefault("timestamp",time.time()); record["key"] = key
+        columns = ",".join( record.keys() )
+        slots = ",".join( [ "?" for k in record.keys() ] )
+        db.execute( f"INSERT OR REPLACE INTO cache ({columns}) VALUES ({slots})",list(record.values()) )
+        self.uncommitted += 1
+    def cache_lookup(self,key):
+      with self.lock:
+        if not ( db := self.connect() ): return None
+        row = db.execute( "SELECT unique_name,jobid,regression_file,output_file FROM cache WHERE key=?",
+                          (key,) ).fetchone()
+      if row is None: return None
+      return dict( zip( [ "unique_name","jobid","regression_file","output_file" ],row ) )
+    def commit_locked(self):
+      if self.connection:
+        self.connection.commit()
+      self.uncommitted = 0
+    def commit(self):
+      with self.lock:
+        self.commit_locked()
+    def query(self,benchmark=None,suite=None,nodes=None,days=None,system=None):
+      ## results selected on any of these keys, most recent first
+      if not ( db := self.connect() ): return []
+      where = []; values = []
+      for column,value in [ ("benchmark",benchmark),("suite",suite),
+                            ("nodes",nodes),("system",system) ]:
+        if value is not None:
+          where.append(f"{column}=?"); values.append(value)
+      if days is not None:
+        where.append("timestamp>=?"); values.append( time.time()-86400*float(days) )
+      sql = "SELECT campaign,suite,benchmark,nodes,ppn,threads,value,samples,unique_name FROM results"
+      if len(where)>0: sql += " WHERE "+" AND ".join(where)
+      return db.execute( sql+" ORDER BY timestamp DESC",values ).fetchall()
+    def close(self):
+      with self.lock:
+        if self.connection:
+          self.connection.commit(); self.connection.close()
+          self.connection = None
+  def __new__(cls):
+    if not ResultsStore.instance:
+      ResultsStore.instance = ResultsStore.__resultsstore()
+    return ResultsStore.instance
+  def __getattr__(self,attr):
+    return self.instance.__getattr__(attr)
+
+if __name__ == "__main__":
+  ## query from the commandline: python3 results.py [ -db file-or-outputdir ] key=value ...
+  args = sys.argv[1:]; path = default_name
+  if len(args)>1 and args[0]=="-db":
+    path = args[1]; args = args[2:]
+  if os.path.isdir(path):
+    path = f"{path}/{default_name}"
+  if not os.path.exists(path):
+    print(f"No results database <<{path}>>"); sys.exit(1)
+  ResultsStore().set_path(path)
+  selection = {}
+  for kv in args:
+    k,v = kv.split("=",1)
+    selection[k] = v
+  for row in ResultsStore().query(**selection):
+    print( " ".join( [ str(f) for f in row ] ) )
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#
+# Demonspawn
+# a utility for quickly generating a slew of batch jobs
+# good for benchmarking, regression testing, and such
+#
+# Victor Eijkhout
+# copyright 2020-2022
+#
+# version 0.5, see the Readme for details
+#
+# scaling.py : strong and weak scaling analysis of a suite
+#
+
+import re
+
+def scaling_options(spec):
+  ## `scaling strong metric:time threshold:0.7' -> dict
+  words = spec.split()
+  options = { "type":"strong","metric":"time","threshold":"0.7" }
+  for w in words:
+    if re.search(":",w):
+      k,v = w.split(":",1)
+      options[k] = v
+    else:
+      options["type"] = w
+  if options["type"] not in [ "strong","weak" ]:
+    raise Exception(f"Unknown scaling type: <<{options['type']}>>")
+  if options["metric"] not in [ "time","rate" ]:
+    raise Exception(f"Unknown scaling metric: <<{options['metric']}>>")
+  threshold = options["threshold"]
+  if perc := re.match(r'([0-9.]+)p',threshold):
+    options["threshold"] = float(perc.groups()[0])/100
+  else:
+    options["threshold"] = float(threshold)
+  return options
+
+def parallelism(nodes,ppn,threads):
+  ## number of cores used; threads<=0 means one core per process
+  return int(nodes)*int(ppn)*max(int(threads),1)
+
+def scaling_series(points,options):
+  #
+  # points: list of dicts with nodes, ppn, threads, value for one benchmark;
+  # add speedup, efficiency, Karp-Flatt serial fraction against the smallest configuration
+  #
+  points = sorted( points,key=lambda p:( parallelism(p["nodes"],p["ppn"],p["threads"]),p["nodes"] ) )
+  base = points[0]; pbase = parallelism(base["nodes"],base["ppn"],base["threads"])
+  for p in points:
+    r = parallelism(p["nodes"],p["ppn"],p["threads"])/pbase; p["ratio"] = r
+    if options["metric"]=="time":
+      gain = base["value"]/p["value"] if p["value"]>0 else 0.
+    else:
+      gain = p["value"]/base["value"] if base["value"]>0 else 0.
+    if options["type"]=="strong":
+      ## time metric: T1/Tp; rate metric: Rp/R1
+      p["speedup"] = gain; p["efficiency"] = gain/r
+    else:
+      ## weak scaling: constant time per core is perfect
+      if options["metric"]=="time":
+        p["efficiency"] = gain; p["speedup"] = gain*r
+      else:
+        p["efficiency"] = gain/r; p["speedup"] = gain
+    if r>1 and p["speedup"]>0:
+      p["karpflatt"] = (1/p["speedup"]-1/r)/(1-1/r)
+    else: p["karpflatt"] = None
+    p["low"] = p["efficiency"]<options["threshold"]
+  return points
+
+def amdahl_fit(points):
+  ## serial fraction f in S = 1/( f+(1-f)/r ), least squares on 1/S
+  num = 0.; den = 0.
+  for p in points:
+    if p["ratio"]>1 and p["speedup"]>0:
+      x = 1-1/p["ratio"]; y = 1/p["speedup"]-1/p["ratio"]
+      num += x*y; den += x*x
+  return num/den if den>0 else None
+
+def gustafson_fit(points):
+  ## serial fraction f in S = r-f(r-1), least squares
+  num = 0.; den = 0.
+  for p in points:
+    if p["ratio"]>1:
+      x = p["ratio"]-1; y = p["ratio"]-p["speedup"]
+      num += x*y; den += x*x
+  return num/den if den>0 else None
+
+def scaling_analysis(results,options):
+  #
+  # results: list of dicts with benchmark, nodes, ppn, threads, value;
+  # return per benchmark the series and the model fits
+  #
+  benchmarks = {}
+  for r in results:
+    benchmarks.setdefault( r["benchmark"],[] ).append( dict(r) )
+  analysis = {}
+  for b,points in sorted( benchmarks.items() ):
+    series = scaling_series(points,options)
+    analysis[b] = { "series":series,
+                    "amdahl":amdahl_fit(series),"gustafson":gustafson_fit(series) }
+  return analysis
+
+def scaling_table(analysis):
+  ## tab-separated table, one line per configuration
+  columns = [ "benchmark","nodes","ppn","threads","ratio","value",
+              "speedup","efficiency","karpflatt","low" ]
+  lines = [ "\t".join(columns) ]
+  for b,a in analysis.items():
+    for p in a["series"]:
+      fields = []
+      for c in columns:
+        v = p[c]
+        fields.append( f"{v:.6g}" if isinstance(v,float) else str(v) )
+      lines.append( "\t".join(fields) )
+  return "\n".join(lines)+"\n"
+
+def scaling_summary(analysis,options,suitename):
+  summary = f"Scaling analysis of suite {suitename}: {options['type']} scaling," \
+    +f" metric={options['metric']}, efficiency threshold={options['threshold']}\n"
+  for b,a in analysis.items():
+    series = a["series"]; base = series[0]
+    summary += f"\n{b}: {len(series)} configurations," \
+      +f" base N={base['nodes']} ppn={base['ppn']} threads={base['threads']}\n"
+    if a["amdahl"] is not None:
+      f = a["amdahl"]
+      limit = f", maximum speedup {1/f:.3g}" if f>0 else ""
+      summary += f"  Amdahl serial fraction {f:.4g}{limit}\n"
+    if a["gustafson"] is not None:
+      summary += f"  Gustafson serial fraction {a['gustafson']:.4g}\n"
+    low = [ p for p in series if p["low"] ]
+    if len(low)>0:
+      first = low[0]
+      summary += f"  efficiency below threshold from N={first['nodes']} ppn={first['ppn']}" \
+        +f" threads={first['threads']}: {first['efficiency']:.3g}\n"
+    else:
+      summary += f"  efficiency above threshold for all configurations\n"
+  return summary
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+#
+# Demonspawn
+# a utility for quickly generating a slew of batch jobs
+# good for benchmarking, regression testing, and such
+#
+# Victor Eijkhout
+# copyright 2020-2022
+#
+# version 0.5, see the Readme for details
+#
+# selfbench.py : benchmarks of demonspawn's own hot paths
+#
+# python3 selfbench.py [ -n jobs ] [ -o results.json ] [ -b baseline.json ] [ -t tolerance ] [ benchmark ... ]
+#
+
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from spawn import Configuration
+from jobsuite import SpawnFiles, SlurmStatus, Queues, macros_substitute
+from journal import Journal
+from results import ResultsStore
+from sweep import ParameterSpace
+
+##
+## stands in for sbatch and squeue: every job is accepted at once, and reported running;
+## squeue also lists jobs of other campaigns, in another queue
+##
+class FakeSlurm():
+  name = "fake"
+  def __init__(self,others=0):
+    self.next_id = 1000; self.jobids = []; self.others = others
+  def sbatch(self,script):
+    jobid = str(self.next_id); self.next_id += 1
+    self.jobids.append(jobid)
+    return [ f"Submitted batch job {jobid}" ]
+  def squeue(self,user,format):
+    return [ f"{id} R normal N/A 10:00" for id in self.jobids ] \
+      + [ f"{id} PD development N/A 10:00" for id in range(10**7,10**7+self.others) ]
+  def sacct(self,jobids,fields):
+    return []
+  def __str__(self):
+    return f"fake, {len(self.jobids)}+{self.others} jobs"
+
+def write_programs(progdir,napps):
+  os.mkdir(progdir)
+  for a in range(napps):
+    path = f"{progdir}/prog_{a}"
+    with open(path,"w") as prog:
+      prog.write("#!/bin/bash\necho BW result 4 1.5\n")
+    os.chmod(path,0o755)
+
+def write_suite_configuration(path,progdir,njobs,napps):
+  ## napps programs times nodes times ppn is about njobs
+  nnodes = max( njobs//(10*napps),1 )
+  with open(path,"w") as conf:
+    conf.write(f"""jobname selfbench
+account bench
+user bench
+time 0:10:00
+queue normal limit:{njobs}
+nodes 1:{nnodes}
+ppn 1:10
+regression grep:BW field:4
+suite name:bench type:mpi dir:{progdir} prog_*
+""")
+
+def write_large_configuration(path,progdir,nlines,nsuites):
+  ## macros, keywords, and suites
+  with open(path,"w") as conf:
+    conf.write("jobname large\naccount bench\nqueue normal limit:10\n")
+    for i in range(nlines):
+      conf.write(f"macro{i} {i}-%[pwd]/%[account]\n")
+    for s in range(nsuites):
+      conf.write(f"nodes 1,{s+2}\nsuite name:s{s} type:seq dir:{progdir} prog_*\n")
+
+def write_outputs(jobs,noise):
+  ## synthetic output: noise lines around the line that the regression greps for
+  generator = random.Random(0)
+  for j in jobs:
+    with open(j.slurm_output_file_name,"w") as out:
+      for i in range(noise):
+        out.write(f"iteration {i} residual {generator.random():.6e}\n")
+      out.write(f"BW result 4 {generator.uniform(10,20):.3f}\n")
+
+def perturbed_copy(rdir,cdir):
+  ## compare directory: all regression values changed by a few percent
+  os.mkdir(cdir)
+  generator = random.Random(1)
+  for f in os.listdir(rdir):
+    with open(f"{rdir}/{f}","r") as src, open(f"{cdir}/{f}","w") as dst:
+      lines = src.readlines()
+      try: lines[0] = f"{float(lines[0])*generator.uniform(.95,1.05):.3f}\n"
+      except ValueError: pass
+      dst.writelines(lines)
+
+class SelfBench():
+  #
+  # runs the benchmarks in order, in a scratch directory;
+  # later benchmarks use the jobs that are created by the `jobs' benchmark
+  #
+  def __init__(self,njobs,workdir):
+    self.njobs = njobs; self.workdir = workdir
+    self.napps = 10
+    self.progdir = f"{workdir}/programs"
+    self.results = {}
+  def measure(self,name,count,function,repeat=1):
+    ## best of `repeat' runs; only benchmarks without side effects are repeated
+    seconds = None
+    with open(os.devnull,"w") as quiet, contextlib.redirect_stdout(quiet):
+      for r in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter()-start
+        seconds = elapsed if seconds is None else min(seconds,elapsed)
+    self.results[name] = { "count":count,"seconds":seconds,"rate":count/max(seconds,1.e-9) }
+    print(f"{name:12} {count:8} items {seconds:9.3f} sec {count/max(seconds,1.e-9):12.1f} /sec")
+  def setup(self):
+    write_programs(self.progdir,self.napps)
+    outputdir = f"{self.workdir}/output"
+    SpawnFiles().setoutputdir(outputdir)
+    SpawnFiles().open_new("logfile-selfbench",key="logfile")
+    ResultsStore().set_path(f"{self.workdir}/results.sqlite")
+    Journal().open(outputdir)
+    self.backend = FakeSlurm(others=self.njobs)
+    SlurmStatus().backend = self.backend
+    SlurmStatus().set_rate(0)
+    self.suite = None
+  def configuration(self,path):
+    configuration = Configuration\
+      (jobname="spawn",date="selfbench",debug=False,submit=True,testing=False,
+       outputdir=SpawnFiles().outputdir,comparedir=None,resume=False,incremental=False)
+    with open(os.devnull,"w") as quiet, contextlib.redirect_stdout(quiet):
+      configuration.parse(path)
+    return configuration
+  def bench_parse(self):
+    nlines = max( self.njobs//10,100 ); nsuites = 20
+    path = f"{self.workdir}/large.conf"
+    write_large_configuration(path,self.progdir,nlines,nsuites)
+    self.measure( "parse",nlines+2*nsuites,lambda:self.configuration(path),repeat=3 )
+  def bench_macros(self):
+    macros = { "pwd":"/home/user","account":"bench","dir":"%[pwd]/%[account]","n":"%[dir]/x" }
+    lines = [ f"line {i} %[dir]/%[n] %[account] %[unknown]" for i in range(self.njobs) ]
+    self.measure( "macros",len(lines),
+                  lambda:[ macros_substitute(line,macros) for line in lines ],repeat=3 )
+  def bench_sweep(self):
+    space = ParameterSpace( { "nodes":"1:100","ppn":"1:64","threads":"0,1,2,4",
+                              "sweep":[ "env:X 1:10" ],"constraint":[ "nodes*ppn<=2048" ] } )
+    self.measure( "sweep",space.size(),lambda:sum( [ 1 for p in space.points() ] ),repeat=3 )
+  def bench_jobs(self):
+    ## job creation, script writing, journal, submission
+    path = f"{self.workdir}/suite.conf"
+    write_suite_configuration(path,self.progdir,self.njobs,self.napps)
+    self.suite = self.configuration(path).configuration["suites"][0]
+    count = self.napps*max( self.njobs//(10*self.napps),1 )*10
+    self.measure( "jobs",count,lambda:self.suite.generate_jobs(submit=True) )
+  def bench_scripts(self):
+    self.measure( "scripts",len(self.suite.jobs),self.suite.generate_scripts )
+  def bench_status(self):
+    ## full status polls, with as many unrelated jobs in squeue as there are of ours
+    npolls = 5
+    def polls():
+      for p in range(npolls): Queues().poll_jobs()
+    self.measure( "status",npolls*len(self.suite.jobs),polls,repeat=3 )
+  def bench_regression(self):
+    write_outputs(self.suite.jobs,noise=200)
+    self.measure( "regression",len(self.suite.jobs),
+                  lambda:self.suite.regression_all(self.suite.jobs) )
+  def bench_compare(self):
+    SpawnFiles().close_files( self.suite.regressionfiles )
+    odir = f"{SpawnFiles().outputdir}/regression"; cdir = f"{self.workdir}/compare"
+    perturbed_copy(odir,cdir)
+    self.measure( "compare",len(self.suite.jobs),
+                  lambda:self.suite.regression_compare("bench",cdir,odir) )
+
+benchmarks = [ "parse","macros","sweep","jobs","scripts","status","regression","compare" ]
+## these need the jobs
+needs_jobs = [ "scripts","status","regression","compare" ]
+
+def compare_baseline(results,baseline,tolerance):
+  ## benchmarks whose rate dropped by more than the tolerance
+  slower = []
+  print(f"\n{'benchmark':12} {'rate':>12} {'baseline':>12} {'ratio':>7}")
+  for name,r in results["benchmarks"].items():
+    if name not in baseline["benchmarks"].keys(): continue
+    base = baseline["benchmarks"][name]
+    if base["count"]!=r["count"]:
+      print(f"{name:12} not comparable: {r['count']} items, baseline {base['count']}"); continue
+    ratio = r["rate"]/base["rate"]
+    flag = ""
+    if ratio<1/(1+tolerance):
+      flag = " SLOWER"; slower.append(name)
+    print(f"{name:12} {r['rate']:12.1f} {base['rate']:12.1f} {ratio:7.2f}{flag}")
+  return slower
+
+if __name__ == "__main__":
+  args = sys.argv[1:]
+  njobs = 10000; output = None; baseline = None; tolerance = .25
+  while len(args)>0 and re.match("^-",args[0]):
+    if args[0]=="-h":
+      print("Usage: python3 selfbench.py [ -n jobs ] [ -o results.json ] [ -b baseline.json ] [ -t tolerance ] [ benchmark ... ]")
+      print(f"Benchmarks: {' '.join(benchmarks)}")
+      sys.exit(0)
+    elif args[0]=="-n":
+      args = args[1:]; njobs = int(args[0])
+    elif args[0]=="-o":
+      args = args[1:]; output = args[0]
+    elif args[0]=="-b":
+      args = args[1:]; baseline = args[0]
+    elif args[0]=="-t":
+      args = args[1:]; tolerance = float(args[0])
+    else:
+      raise Exception(f"Unknown option: <<{args[0]}>>")
+    args = args[1:]
+  selected = args if len(args)>0 else benchmarks
+  for name in selected:
+    if name not in benchmarks:
+      raise Exception(f"Unknown benchmark <<{name}>>, choose from {benchmarks}")
+  if any( [ name in needs_jobs for name in selected ] ) and "jobs" not in selected:
+    selected = [ "jobs" ]+selected
+  workdir = tempfile.mkdtemp(prefix="demonspawn-selfbench-")
+  cwd = os.getcwd()
+  try:
+    ## the suites are set up relative to the scratch directory
+    os.chdir(workdir)
+    bench = SelfBench(njobs,workdir); bench.setup()
+    for name in benchmarks:
+      if name in selected:
+        getattr(bench,f"bench_{name}")()
+    ResultsStore().close(); Journal().close()
+  finally:
+    os.chdir(cwd)
+    shutil.rmtree(workdir,ignore_errors=True)
+  results = { "date":datetime.datetime.now().isoformat(timespec="seconds"),
+              "host":platform.node(),"python":platform.python_version(),
+              "cpus":os.cpu_count(),"jobs":njobs,"benchmarks":bench.results }
+  if output:
+    with open(output,"w") as out:
+      json.dump(results,out,indent=2)
+    print(f"Results in {output}")
+  if baseline:
+    with open(baseline,"r") as base:
+      slower = compare_baseline( results,json.load(base),tolerance )
+    if len(slower)>0:
+      print(f"Slower than baseline by more than {100*tolerance:.0f} percent: {' '.join(slower)}")
+      sys.exit(1)
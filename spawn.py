@@ -12,6 +12,7 @@
 # spawn.py : main diver file
 #
 
+import asyncio
 import copy
 import datetime
 import os
@@ -24,6 +25,7 @@ import time
 # Local
 from jobsuite import *
 from pathlib import Path
+from results import default_name as results_default_name
 
 keyword_command = [ "nodes", "ppn", "suite", ]
 keyword_reserved = [ "system", "modules", 
@@ -42,6 +44,7 @@ def DefaultModules():
   return "intel/18.0.2"
 
 def wait_for_jobs( jobs ):
+  poll = AdaptivePoll( Queues().poll_min,Queues().poll_max ); previous = None
   while True:
     running = []; pending = []
     for j in jobs:
@@ -54,7 +57,8 @@ def wait_for_jobs( jobs ):
     print(f"Running: {running} Pending: {pending}")
     if len(running)+len(pending)==0:
       break
-    time.sleep(1)
+    changed = previous!=(running,pending); previous = (running,pending)
+    time.sleep( poll.next( changed,SlurmStatus().next_event(running+pending) ) )
 
 def get_suite_name(options,values):
   if "name" in options.keys():
@@ -94,7 +98,7 @@ class Configuration():
       self.configuration[key] = val
     jobname = self.configuration["jobname"]
     self.configuration["modules"]   = "default"
-    self.configuration["time"] = "0:37:0"
+    self.configuration["time"] = "01:00:00"
     try :
       self.configuration["system"]    = os.environ["TACC_SYSTEM"]
     except:
@@ -105,7 +109,7 @@ class Configuration():
       self.configuration["mpi"]       = "mpich"
     self.configuration["pwd"]       = os.getcwd()
   def parse(self,filename,**kwargs):
-    for k in [ "suites","sbatch","env" ]:
+    for k in [ "suites","sbatch","env","sweep","constraint" ]:
       self.configuration[k] = []
     queue = None
     with open(filename,"r") as configuration:
@@ -128,22 +132,59 @@ class Configuration():
         value = macros_substitute( value,self.configuration )
 
         # special case: jobname can be set only once
-        if key=="jobname" and jobname != "spawn":
-            raise Exception(f"Job name can be set only once, current: {jobname}")
+        if key=="jobname" and self.configuration["jobname"] != "spawn":
+            raise Exception(f"Job name can be set only once, current: {self.configuration['jobname']}")
         # special case: queue
         elif key=="queue":
             queue = value; nam_lim = value.split(); qname = nam_lim[0]; qlimit = 1
-            if len(nam_lim)>1:
-                qlimit = nam_lim[1]
-                if re.match("limit",qlimit):
-                    qlimit = qlimit.split(":")[1]
-            Queues().add_queue( qname,qlimit )
+            policy = {}
+            for option in nam_lim[1:]:
+                if re.match("limit",option):
+                    qlimit = option.split(":")[1]
+                elif re.search(":",option):
+                    ## nodes:N budget:nodehours order:fifo|largest|shortest|roundrobin
+                    k,v = option.split(":",1)
+                    if k not in [ "nodes","budget","order" ]:
+                        raise Exception(f"Unknown queue option: <<{option}>>")
+                    policy[k] = v
+                else:
+                    qlimit = option
+            Queues().add_queue( qname,qlimit,**policy )
             self.configuration[key] = qname
+        # special case: squeue cache lifetime and slurm call rate
+        elif key=="pollinterval":
+            SlurmStatus().set_ttl(value)
+            self.configuration[key] = value
+        elif key=="slurmrate":
+            SlurmStatus().set_rate(value)
+            self.configuration[key] = value
+        # special case: where the jobs run
+        elif key=="backend":
+            if not self.configuration.get("plan",False):
+                SlurmStatus().set_backend(value)
+                if SlurmStatus().backend.name=="local":
+                    Queues().poll_min = .1; Queues().poll_max = 1.
+            self.configuration[key] = value
+        # special case: bounds for the adaptive job polling
+        elif key=="pollmin":
+            Queues().poll_min = float(value)
+            self.configuration[key] = value
+        elif key=="pollmax":
+            Queues().poll_max = float(value)
+            self.configuration[key] = value
+        # special case: bound on the number of open files
+        elif key=="maxopenfiles":
+            SpawnFiles().set_max_handles(value)
+            self.configuration[key] = value
+        # special case: results database
+        elif key=="resultsdb":
+            ResultsStore().set_path(value)
+            self.configuration[key] = value
         # special case: output dir needs to be set immediately
         elif key=="outputdir":
           raise Exception("outputdir key deprecated")
-        # special case: `sbatch'  and `env' lines are appended
-        elif key in ["sbatch","env"]:
+        # special case: `sbatch', `env', `sweep', `constraint' lines are appended
+        elif key in ["sbatch","env","sweep","constraint"]:
           self.configuration[key].append(value)
         #
         # suite or macro
@@ -158,10 +199,67 @@ class Configuration():
         else:
           self.configuration[key] = value
   def run(self):
-    for s in self.configuration["suites"]:
-      s.run(debug=self.configuration["debug"],
-            submit=self.configuration["submit"],
-            testing=self.configuration["testing"])
+    if self.configuration.get("suiteorder","sequential")=="concurrent" \
+       and self.configuration["submit"]:
+      asyncio.run( self.run_concurrently() )
+    else:
+      for s in self.configuration["suites"]:
+        s.run(debug=self.configuration["debug"],
+              submit=self.configuration["submit"],
+              testing=self.configuration["testing"])
+    if self.configuration["submit"]:
+      self.timeline_report()
+  def plan(self):
+    ## job counts and node-hours of all suites; nothing is written or submitted
+    plans = [ s.plan() for s in self.configuration["suites"] ]
+    budgets = { name:q.budget for name,q in Queues().queues.items() if q.budget is not None }
+    print( plan_summary(plans,self.configuration["jobname"],budgets),end="" )
+  def timeline_report(self):
+    ## campaign metrics over all suites; each suite has already reported its own
+    suites = self.configuration["suites"]
+    records = [ j.timeline for s in suites for j in s.jobs if j.timeline is not None ]
+    if len(suites)<2 or len(records)==0: return
+    metrics = campaign_metrics(records)
+    name = self.configuration["jobname"]
+    source = "sacct" if any( [ r["state"] is not None for r in records ] ) else "status polling"
+    for extension,contents in [ ("tsv",timeline_table(records,metrics["start"])),
+                                ("txt",timeline_summary(metrics,f"campaign {name}",source)) ]:
+      handle,tdir,tfile,tkey = SpawnFiles().open_new(f"timeline-{name}.{extension}")
+      handle.write(contents)
+      SpawnFiles().close_files( [tkey] )
+    print(f"Campaign timeline in {tdir}/timeline-{name}.txt")
+  async def run_concurrently(self):
+    #
+    # all suites feed into the global queues, which are watched by a single scheduler;
+    # a suite with `after:othersuite' starts when that suite has completely finished
+    #
+    loop = asyncio.get_running_loop()
+    kwargs = { "debug":self.configuration["debug"],
+               "submit":self.configuration["submit"],
+               "testing":self.configuration["testing"] }
+    suites = self.configuration["suites"]
+    done = {}
+    for s in suites:
+      for d in s.dependencies():
+        if d not in done.keys():
+          raise Exception(f"Suite <<{s.suite_name()}>> can only run after an earlier suite, not <<{d}>>")
+      done[ s.suite_name() ] = asyncio.Event()
+    all_done = asyncio.Event(); progress = asyncio.Condition()
+    async def run_suite(s):
+      for d in s.dependencies():
+        await done[d].wait()
+      await loop.run_in_executor( None,lambda:s.generate_jobs(**kwargs) )
+      async with progress:
+        await progress.wait_for( s.is_finished )
+      s.finish(**kwargs)
+      done[ s.suite_name() ].set()
+    watcher = asyncio.create_task( Queues().watch_jobs(until=all_done,progress=progress) )
+    await asyncio.gather( *[ run_suite(s) for s in suites ] )
+    all_done.set()
+    await watcher
+    Queues().logprinter("Done all suites")
+    Queues().logprinter(str(SlurmStatus()))
+    Queues().logprinter(Queues().usage())
 
 if __name__ == "__main__":
   if sys.version_info[0]<3:
@@ -169,12 +267,12 @@ if __name__ == "__main__":
   if sys.version_info[1]<8:
     print("This requires at least python 3.8"); sys.exit(1)
   args = sys.argv[1:]
-  testing = False; debug = False; submit  = True
+  testing = False; debug = False; submit  = True; resume = False; incremental = False; plan = False
   jobname = "spawn"; outputdir = None; comparedir = None
   rootdir = os.getcwd()
   while re.match("^-",args[0]):
     if args[0]=="-h":
-      print("Usage: python3 batch.py [ -h ]  [ -d --debug ] [ -f --filesonly ] [ -t --test ] [ -n name ] [ -r --regression dir ] [ -o --output dir ] [ -c --compare dir ]")
+      print("Usage: python3 batch.py [ -h ]  [ -d --debug ] [ -f --filesonly ] [ -t --test ] [ -n name ] [ -r --regression dir ] [ -o --output dir ] [ -c --compare dir ] [ --resume dir ] [ --incremental ] [ --plan ]")
       sys.exit(0)
     elif args[0] == "-n":
       args = args[1:]; jobname = args[0]
@@ -182,6 +280,14 @@ if __name__ == "__main__":
       submit = False; testing = False
     elif args[0] in [ "-o",  "--outputdir" ] :
       args = args[1:]; outputdir = args[0]
+    elif args[0]=="--incremental" :
+      incremental = True
+    elif args[0]=="--plan" :
+      plan = True; submit = False; testing = False
+    elif args[0]=="--resume" :
+      args = args[1:]; outputdir = args[0]; resume = True
+      if not os.path.exists(outputdir):
+        raise Exception(f"Resume directory <<{outputdir}>> does not exist")
     elif args[0] in [ "-r",  "--regression" ] :
       args = args[1:]; outputdir = args[0]
       testing = True; submit = False
@@ -194,19 +300,26 @@ if __name__ == "__main__":
     elif args[0] in [ "-d", "--debug" ]:
       debug = True
       SpawnFiles().debug = True
+      SlurmStatus().debug = True
     args = args[1:]
   now = datetime.datetime.now()
   starttime = f"{now.year}{now.month}{now.day}-{now.hour}.{now.minute}"
 
-  print(f"Output dir: {outputdir}")
-  if not outputdir:
-    outputdir = f"spawn_output_{starttime}"
-  SpawnFiles().setoutputdir(outputdir)
-
-  SpawnFiles().open_new(f"logfile-{jobname}-{starttime}",key="logfile")
+  ## a plan creates no output directory or logfile
+  if not plan:
+    print(f"Output dir: {outputdir}")
+    if not outputdir:
+      outputdir = f"spawn_output_{starttime}"
+    SpawnFiles().setoutputdir(outputdir)
+    ## by default the results database is in the output directory; `resultsdb' overrides this
+    ResultsStore().set_path(f"{outputdir}/{results_default_name}")
+    SpawnFiles().open_new(f"logfile-{jobname}-{starttime}",key="logfile")
+  if submit:
+    Journal().open(outputdir,resume)
   configuration = Configuration\
                   (jobname=jobname,date=starttime,debug=debug,submit=submit,testing=testing,
-                   outputdir=outputdir,comparedir=comparedir)
+                   outputdir=outputdir,comparedir=comparedir,resume=resume,incremental=incremental,
+                   plan=plan)
   queues = Queues()
   queues.testing = testing
   if os.path.exists(".spawnrc"):
@@ -217,8 +330,13 @@ if __name__ == "__main__":
       configuration.parse(globalrc)
   configuration.parse(args[0])
 
+  if plan:
+    configuration.plan(); sys.exit(0)
   # now activate all the suites
   configuration.run()
   # close all files
+  ResultsStore().close()
+  Journal().close()
+  SpawnFiles().get("logfile").write(str(SpawnFiles())+"\n")
   SpawnFiles().__del__()
 
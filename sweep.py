@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+#
+# Demonspawn
+# a utility for quickly generating a slew of batch jobs
+# good for benchmarking, regression testing, and such
+#
+# Victor Eijkhout
+# copyright 2020-2022
+#
+# version 0.5, see the Readme for details
+#
+# sweep.py : the parameter space of a suite
+#
+
+import ast
+import itertools
+import random
+import re
+
+def parse_values(spec,numeric=True):
+  #
+  # comma-separated list of values, where a numeric item can be a range:
+  # `2:16' is 2,3,...,16, `2:16:2' is 2,4,...,16, `2:256:x2' is 2,4,8,...,256
+  #
+  values = []
+  for item in spec.split(","):
+    item = item.strip()
+    if len(item)==0: continue
+    if r := re.match(r'^(-?[0-9]+):(-?[0-9]+)(:(x?)([0-9]+))?$',item):
+      lo,hi,_,geometric,step = r.groups()
+      lo = int(lo); hi = int(hi); step = int(step) if step else 1
+      if geometric:
+        if lo<1 or step<2:
+          raise Exception(f"Geometric range needs start>0 and factor>1: <<{item}>>")
+        v = lo
+        while v<=hi:
+          values.append(v); v *= step
+      else:
+        if step<1:
+          raise Exception(f"Range needs a positive step: <<{item}>>")
+        values.extend( range(lo,hi+1,step) )
+    elif numeric:
+      try:
+        values.append( int(item) )
+      except ValueError:
+        raise Exception(f"Not a number or range: <<{item}>>")
+    else:
+      values.append(item)
+  if len(values)==0:
+    raise Exception(f"Empty value list: <<{spec}>>")
+  return values
+
+##
+## constraints are arithmetic and boolean expressions;
+## anything else, such as function calls or attributes, is rejected
+##
+allowed_nodes = ( ast.Expression,ast.BoolOp,ast.BinOp,ast.UnaryOp,ast.Compare,
+                  ast.Name,ast.Load,ast.Constant,
+                  ast.And,ast.Or,ast.Not,ast.USub,ast.UAdd,
+                  ast.Add,ast.Sub,ast.Mult,ast.Div,ast.FloorDiv,ast.Mod,ast.Pow,
+                  ast.Eq,ast.NotEq,ast.Lt,ast.LtE,ast.Gt,ast.GtE )
+
+def compile_constraint(text):
+  try:
+    tree = ast.parse(text,mode="eval")
+  except SyntaxError:
+    raise Exception(f"Can not parse constraint: <<{text}>>")
+  for node in ast.walk(tree):
+    if not isinstance(node,allowed_nodes):
+      raise Exception(f"Constraint <<{text}>> can only contain arithmetic and comparisons")
+  names = set( [ n.id for n in ast.walk(tree) if isinstance(n,ast.Name) ] )
+  return text,names,compile(tree,"<constraint>","eval")
+
+def name_part(value):
+  ## make a value usable in a job name
+  return re.sub( r'[^A-Za-z0-9_.=+-]','_',re.sub('/','-',str(value)) )
+
+class ParameterSpace():
+  #
+  # nodes, ppn, threads, plus sweeps over environment variables, modules, program arguments;
+  # points are generated lazily, filtered by the constraints, and optionally sampled
+  #
+  def __init__(self,configuration):
+    if configuration.get("cores",None) is not None:
+      raise Exception("Cores keyword not supported")
+    self.nodes   = parse_values( str( configuration.get("nodes","1") ) )
+    self.ppn     = parse_values( str( configuration.get("ppn","1") ) )
+    self.threads = parse_values( str( configuration.get("threads","0") ) )
+    ## extra dimensions: list of (kind,name,values)
+    self.dimensions = []
+    for sweep in configuration.get("sweep",[]):
+      what,values = sweep.split(" ",1)
+      if what in [ "modules","args" ]:
+        self.dimensions.append( (what,what,parse_values(values,numeric=False)) )
+      elif re.match("env:",what):
+        self.dimensions.append( ("env",what[4:],parse_values(values,numeric=False)) )
+      else:
+        raise Exception(f"Unknown sweep dimension <<{what}>>, use env:NAME, modules, args")
+    self.constraints = [ compile_constraint(c) for c in configuration.get("constraint",[]) ]
+    known = set( [ "nodes","ppn","threads","cores","modules","args" ]
+                 +[ name for kind,name,_ in self.dimensions ] )
+    for text,names,_ in self.constraints:
+      if unknown := names-known:
+        raise Exception(f"Constraint <<{text}>> uses unknown names: {sorted(unknown)}")
+    self.sample = None; self.seed = 0
+    if sample := configuration.get("sample",None):
+      words = sample.split()
+      self.sample = int(words[0])
+      for w in words[1:]:
+        if re.match("seed:",w): self.seed = int(w.split(":")[1])
+  def size(self):
+    ## number of points before constraints
+    n = len(self.nodes)*len(self.ppn)*len(self.threads)
+    for _,_,values in self.dimensions: n *= len(values)
+    return n
+  def all_points(self):
+    ## extra dimensions vary slowest, nodes fastest
+    extra = [ values for _,_,values in self.dimensions ]
+    for e in itertools.product(*extra):
+      for t,p,n in itertools.product(self.threads,self.ppn,self.nodes):
+        point = { "nodes":n,"ppn":p,"threads":t,"env":{},"modules":None,"args":None }
+        variant = []
+        for (kind,name,_),v in zip(self.dimensions,e):
+          if kind=="env": point["env"][name] = v
+          else: point[kind] = v
+          variant.append( name_part(v) )
+        point["variant"] = "".join( [ "-"+v for v in variant ] )
+        yield point
+  def feasible(self,point):
+    if len(self.constraints)==0: return True
+    values = { "nodes":point["nodes"],"ppn":point["ppn"],"threads":point["threads"],
+               "cores":point["nodes"]*point["ppn"],
+               "modules":point["modules"],"args":point["args"] }
+    for name,v in point["env"].items():
+      ## environment values compare as numbers where possible
+      try: values[name] = int(v)
+      except ValueError:
+        try: values[name] = float(v)
+        except ValueError: values[name] = v
+    for text,_,code in self.constraints:
+      if not eval(code,{"__builtins__":{}},values):
+        return False
+    return True
+  def points(self):
+    ## generator over the feasible points, or a reservoir sample of them
+    feasible = ( p for p in self.all_points() if self.feasible(p) )
+    if self.sample is None:
+      yield from feasible; return
+    generator = random.Random(self.seed); reservoir = []
+    for i,p in enumerate(feasible):
+      if i<self.sample:
+        reservoir.append( (i,p) )
+      elif ( j := generator.randint(0,i) )<self.sample:
+        reservoir[j] = (i,p)
+    ## keep the sampled points in enumeration order
+    for i,p in sorted( reservoir,key=lambda ip:ip[0] ):
+      yield p
+  def __str__(self):
+    description = f"nodes={self.nodes} ppn={self.ppn} threads={self.threads}"
+    for kind,name,values in self.dimensions:
+      description += f" {name}={values}"
+    for text,_,_ in self.constraints:
+      description += f" constraint: {text}"
+    if self.sample is not None:
+      description += f" sample: {self.sample} seed: {self.seed}"
+    return description+f" ({self.size()} points before constraints)"
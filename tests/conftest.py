@@ -0,0 +1,8 @@
+#
+# Demonspawn tests: the modules live in the top directory
+#
+
+import os
+import sys
+
+sys.path.insert( 0,os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
@@ -0,0 +1,56 @@
+#
+# Demonspawn tests: suites running concurrently under the global scheduler
+#
+
+import asyncio
+import os
+
+from jobsuite import SpawnFiles, SlurmStatus, Queues
+from results import ResultsStore
+from spawn import Configuration
+
+class RejectingSlurm():
+  ## sbatch rejects the scripts of suite `bad'; accepted jobs finish at once
+  name = "rejecting"
+  def __init__(self):
+    self.next_id = 1000
+  def sbatch(self,script):
+    if os.path.basename(script).startswith("bad-"):
+      return [ "sbatch: error: QOSMaxSubmitJobPerUserLimit" ]
+    self.next_id += 1
+    return [ f"Submitted batch job {self.next_id}" ]
+  def squeue(self,user,format):
+    return []
+  def sacct(self,jobids,fields):
+    return []
+  def __str__(self):
+    return self.name
+
+def test_failed_submit_finishes_concurrent_suite(tmp_path,monkeypatch):
+  monkeypatch.chdir(tmp_path)
+  outputdir = str(tmp_path/"output")
+  SpawnFiles().setoutputdir(outputdir)
+  SpawnFiles().open_new("logfile-concurrent",key="logfile")
+  ResultsStore().set_path("none")
+  monkeypatch.setattr( SlurmStatus(),"backend",RejectingSlurm() )
+  SlurmStatus().set_rate(0); SlurmStatus().set_ttl(0)
+  monkeypatch.setattr( Queues(),"poll_min",.01 ); monkeypatch.setattr( Queues(),"poll_max",.05 )
+  conf = tmp_path/"concurrent.conf"
+  conf.write_text(f"""user me
+account test
+time 0:01:00
+suiteorder concurrent
+## with a queue policy all jobs are submitted by the scheduler
+queue failing limit:4 order:shortest
+suite name:good type:seq dir:{tmp_path} prog
+suite name:bad type:seq dir:{tmp_path} prog
+""")
+  configuration = Configuration\
+    (jobname="spawn",date="test",debug=False,submit=True,testing=False,
+     outputdir=outputdir,comparedir=None,resume=False,incremental=False)
+  configuration.parse(str(conf))
+  asyncio.run( asyncio.wait_for( configuration.run_concurrently(),timeout=30 ) )
+  jobs = { s.suite_name():s.jobs for s in configuration.configuration["suites"] }
+  assert all( [ j.processed for js in jobs.values() for j in js ] )
+  assert [ j.jobid for j in jobs["bad"] ]==[ "1" ]
+  assert Queues().queues["failing"].failed==1
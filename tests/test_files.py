@@ -0,0 +1,26 @@
+#
+# Demonspawn tests: the pool of open files
+#
+
+from jobsuite import SpawnFiles
+
+def test_one_shot_file_leaves_the_pool(tmp_path):
+  files = SpawnFiles()
+  files.setoutputdir(str(tmp_path))
+  entries = len(files.file_names),len(files.paths),len(files.wrappers)
+  handle,sdir,sfile,key = files.open_new("job.script",subdir="scripts")
+  handle.write("#!/bin/bash\n")
+  files.close_files( [key] )
+  assert ( len(files.file_names),len(files.paths),len(files.wrappers) )==entries
+  assert (tmp_path/"scripts"/"job.script").read_text()=="#!/bin/bash\n"
+
+def test_first_open_for_append_is_not_a_reopen(tmp_path):
+  files = SpawnFiles()
+  files.setoutputdir(str(tmp_path))
+  opens,reopens = files.stats["opens"],files.stats["reopens"]
+  handle,_,_,key = files.open_new("regression-s1.txt",append=True)
+  assert ( files.stats["opens"],files.stats["reopens"] )==( opens+1,reopens )
+  ## an evicted file is reopened on the next write
+  files.release(key); handle.write("File: s1 Result: 1.49\n")
+  assert ( files.stats["opens"],files.stats["reopens"] )==( opens+1,reopens+1 )
+  files.close_files( [key] )
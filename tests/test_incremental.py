@@ -0,0 +1,22 @@
+#
+# Demonspawn tests: taking over the files of an earlier identical job
+#
+
+import os
+
+from jobsuite import link_file
+
+def test_link_file_onto_itself_keeps_the_file(tmp_path):
+  path = tmp_path/"s1-bench.sh-1-1-0.txt"
+  path.write_text("Result: 1.49\n")
+  link_file(str(path),str(path))
+  link_file(str(path),f"{tmp_path}/../{tmp_path.name}/{path.name}")
+  assert path.read_text()=="Result: 1.49\n"
+  assert os.listdir(tmp_path)==[ path.name ]
+
+def test_link_file_replaces_the_target(tmp_path):
+  source = tmp_path/"old.txt"; target = tmp_path/"new.txt"
+  source.write_text("Result: 1.49\n"); target.write_text("stale\n")
+  link_file(str(source),str(target))
+  assert target.read_text()=="Result: 1.49\n"
+  assert sorted( os.listdir(tmp_path) )==[ "new.txt","old.txt" ]
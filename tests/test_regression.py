@@ -0,0 +1,81 @@
+#
+# Demonspawn tests: extraction of the regression value from job output
+#
+
+import jobsuite
+from jobsuite import regression_test_dict, extract_regression, regression_worker
+
+benchmark_output = """# OSU MPI Latency Test
+# Size          Latency (us)
+1                       1.52
+2                       1.50
+4                       1.49
+"""
+
+tacc_trailer = """TACC: Starting up job 123456
+TACC: Shutdown complete. Exiting.
+"""
+
+def output_file(tmp_path,text):
+  path = tmp_path/"job.out"
+  path.write_text(text)
+  return str(path)
+
+def test_line_last_skips_tacc_trailer(tmp_path):
+  path = output_file(tmp_path,benchmark_output+tacc_trailer)
+  rtest = regression_test_dict("line:last field:2")
+  assert extract_regression(path,rtest)=="4                       1.49"
+  ## the output file itself is not filtered
+  with open(path) as f:
+    assert f.read()==benchmark_output+tacc_trailer
+
+def test_line_counts_skip_tacc_lines(tmp_path):
+  path = output_file(tmp_path,tacc_trailer+benchmark_output+tacc_trailer)
+  assert extract_regression( path,regression_test_dict("line:first") )=="# OSU MPI Latency Test"
+  assert extract_regression( path,regression_test_dict("line:-2") )=="2                       1.50"
+
+def test_tail_reads_past_long_trailer(tmp_path):
+  ## the trailer is longer than one block that is read from the end
+  path = output_file(tmp_path,benchmark_output+"TACC: epilog\n"*10000)
+  assert extract_regression( path,regression_test_dict("line:last") )=="4                       1.49"
+
+def test_tail_lines_across_small_blocks(tmp_path):
+  ## lines, empty ones included, that straddle the blocks read from the end
+  text = "a\n\nb é\r\nTACC: x\nc\n\nTACC: y\n"
+  path = output_file(tmp_path,text)
+  for blocksize in [1,2,3,5,64]:
+    assert jobsuite.tail_lines(path,4,jobsuite.re.compile("^TACC"),blocksize)==[ "","b é","c","" ]
+    assert jobsuite.tail_lines(path,10,None,blocksize)==text.splitlines()
+
+def test_grep_skips_tacc_lines(tmp_path,monkeypatch):
+  path = output_file(tmp_path,"TACC: job 123 done\n"+benchmark_output+"done 5\n")
+  rtest = regression_test_dict("grep:done")
+  assert extract_regression(path,rtest)=="done 5"
+  ## same for large files, which are searched in a memory map
+  monkeypatch.setattr(jobsuite,"MMAP_THRESHOLD",0)
+  assert extract_regression(path,rtest)=="done 5"
+
+def test_table_skips_tacc_trailer(tmp_path):
+  path = output_file(tmp_path,benchmark_output+tacc_trailer)
+  table = extract_regression( path,regression_test_dict("table:last field:2") )
+  assert table["rows"][-1]==[4.,1.49]
+
+def test_skip_none_keeps_tacc_lines(tmp_path):
+  path = output_file(tmp_path,benchmark_output+tacc_trailer)
+  assert extract_regression( path,regression_test_dict("line:last skip:none") ) \
+    =="TACC: Shutdown complete. Exiting."
+
+def test_worker_skips_tacc_trailer(tmp_path):
+  path = output_file(tmp_path,benchmark_output+tacc_trailer)
+  line,size,error = regression_worker( (path,"line:last field:2") )
+  assert line=="4                       1.49" and error is None
+
+def test_take_percentile_out_of_range():
+  assert regression_test_dict("grep:BW field:4 take:p90")["take"]=="p90"
+  for take in [ "p150","p100.5","p1.2.3" ]:
+    try:
+      regression_test_dict(f"grep:BW field:4 take:{take}")
+    except Exception as e:
+      assert "percentile" in str(e)
+    else:
+      assert False,f"take:{take} accepted"
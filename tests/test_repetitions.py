@@ -0,0 +1,39 @@
+#
+# Demonspawn tests: repeated runs of a configuration
+#
+
+from jobsuite import Repetitions
+
+class Run():
+  def __init__(self,number):
+    self.processed = False
+    self.result = { "number":number } if number is not None else None
+
+class Suite():
+  def __init__(self):
+    self.added = []
+  def add_repetition(self,rset):
+    self.added.append(rset)
+
+def adaptive(runs,monkeypatch):
+  suite = Suite()
+  rset = Repetitions(suite,"s1-bench-1",{ "ci":.01,"max":5,"level":.95 },None)
+  rset.jobs = runs; summaries = []
+  monkeypatch.setattr( rset,"summarize",lambda:summaries.append( rset.numbers() ) )
+  return suite,rset,summaries
+
+def test_unsubmitted_last_run_summarizes(monkeypatch):
+  ## the adaptive extra is skipped: the group is summarized over the runs it has
+  first,second,extra = Run(10.),Run(20.),Run(None)
+  suite,rset,summaries = adaptive([first,second,extra],monkeypatch)
+  for run in [first,second]:
+    run.processed = True
+  rset.done(extra,more=False)
+  assert rset.complete and summaries==[ [10.,20.] ] and suite.added==[]
+
+def test_finished_run_asks_for_more(monkeypatch):
+  first,second = Run(10.),Run(20.)
+  suite,rset,summaries = adaptive([first,second],monkeypatch)
+  first.processed = True
+  rset.done(second)
+  assert not rset.complete and summaries==[] and suite.added==[rset]
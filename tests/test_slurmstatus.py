@@ -0,0 +1,59 @@
+#
+# Demonspawn tests: the shared squeue cache
+#
+
+from backends import SlurmCallFailed
+from jobsuite import SlurmStatus
+
+class FlakySlurm():
+  ## squeue lists one running job, or fails
+  name = "flaky"
+  def __init__(self):
+    self.fail = False; self.calls = 0
+  def squeue(self,user,format):
+    self.calls += 1
+    if self.fail:
+      raise SlurmCallFailed("squeue exited with status 1: slurm_load_jobs error: Socket timed out")
+    return [ "1001 R normal N/A 10:00" ]
+
+def test_failed_squeue_keeps_previous_status(monkeypatch):
+  backend = FlakySlurm()
+  status = SlurmStatus()
+  monkeypatch.setattr(status,"backend",backend)
+  monkeypatch.setattr(status,"min_interval",0.)
+  monkeypatch.setattr(status,"failures",0); monkeypatch.setattr(status,"retry_at",None)
+  assert status.query(user="me",force=True).get("1001")=="R"
+  backend.fail = True
+  assert status.query(user="me",force=True).get("1001")=="R"
+  assert backend.calls==2 and status.failures==1
+  ## during the back-off squeue is not called again
+  assert status.query(user="me",force=True).get("1001")=="R"
+  assert backend.calls==2
+  ## after the back-off a successful call replaces the statuses
+  backend.fail = False; status.retry_at = 0.
+  assert status.query(user="me",force=True).get("1001")=="R"
+  assert backend.calls==3 and status.failures==0 and status.retry_at is None
+
+class SubmittingSlurm(FlakySlurm):
+  ## a job is submitted by another thread while squeue runs, and is not in its output
+  def squeue(self,user,format):
+    SlurmStatus().register_submission("1002","normal")
+    return FlakySlurm.squeue(self,user,format)
+
+def test_submission_during_squeue_is_pending(monkeypatch):
+  status = SlurmStatus()
+  monkeypatch.setattr(status,"backend",SubmittingSlurm())
+  monkeypatch.setattr(status,"min_interval",0.)
+  monkeypatch.setattr(status,"failures",0); monkeypatch.setattr(status,"retry_at",None)
+  statuses = status.query(user="me",force=True)
+  assert statuses.get("1001")=="R" and statuses.get("1002")=="PD"
+
+def test_query_reuses_status_within_ttl(monkeypatch):
+  backend = FlakySlurm()
+  status = SlurmStatus()
+  monkeypatch.setattr(status,"backend",backend)
+  monkeypatch.setattr(status,"min_interval",0.); monkeypatch.setattr(status,"ttl",60.)
+  monkeypatch.setattr(status,"failures",0); monkeypatch.setattr(status,"retry_at",None)
+  status.query(user="me",force=True)
+  assert status.query(user="me").get("1001")=="R"
+  assert backend.calls==1
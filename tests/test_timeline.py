@@ -0,0 +1,22 @@
+#
+# Demonspawn tests: campaign metrics from the accounting records
+#
+
+from timeline import add_intervals, campaign_metrics
+
+def record(name,jobid,nodes,submit,start,end):
+  return add_intervals( { "name":name,"jobid":jobid,"queue":"normal","nodes":nodes,
+                          "submit":submit,"start":start,"end":end,
+                          "exitcode":"0:0","state":"COMPLETED","energy":100. } )
+
+def test_pack_allocation_counts_once():
+  ## three jobs in one 4-node pack of an hour, after a ten minute wait, and one single job
+  pack = [ record(f"s1-bench-{n}",1001,4,0.,600.,4200.) for n in [1,2,4] ]
+  single = record("s1-bench-8",1002,8,0.,0.,1800.)
+  metrics = campaign_metrics( pack+[single] )
+  assert metrics["njobs"]==4
+  assert metrics["nodehours"]==4*1.+8*.5
+  assert metrics["energy"]==200.
+  assert metrics["busy"]==4200.
+  assert metrics["queues"]["normal"]["njobs"]==2
+  assert metrics["queues"]["normal"]["mean"]==300.
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+#
+# Demonspawn
+# a utility for quickly generating a slew of batch jobs
+# good for benchmarking, regression testing, and such
+#
+# Victor Eijkhout
+# copyright 2020-2022
+#
+# version 0.5, see the Readme for details
+#
+# timeline.py : queue wait, runtime, and throughput of a campaign
+#
+
+import math
+import statistics
+import time
+
+## fields requested from `sacct -P', in this order
+sacct_fields = [ "JobID","Submit","Start","End","ExitCode","NNodes",
+                 "ConsumedEnergyRaw","State","Partition" ]
+
+failed_states = [ "FAILED","TIMEOUT","CANCELLED","NODE_FAIL","OUT_OF_MEMORY","PREEMPTED","BOOT_FAIL" ]
+
+def slurm_timestamp(text):
+  ## `2022-10-17T13:01:02' to seconds since the epoch; None for Unknown, None, empty
+  try:
+    return time.mktime( time.strptime(text.strip(),"%Y-%m-%dT%H:%M:%S") )
+  except ValueError:
+    return None
+
+def parse_sacct(lines):
+  #
+  # lines of `sacct -X -n -P -o <sacct_fields>' output;
+  # return a dict from job id to record
+  #
+  records = {}
+  for line in lines:
+    fields = line.rstrip("\n").split("|")
+    if len(fields)<len(sacct_fields): continue
+    f = dict( zip(sacct_fields,fields) )
+    record = { "jobid":f["JobID"],
+               "submit":slurm_timestamp(f["Submit"]),
+               "start":slurm_timestamp(f["Start"]),
+               "end":slurm_timestamp(f["End"]),
+               "exitcode":f["ExitCode"],
+               ## `CANCELLED by 1234' -> CANCELLED
+               "state":f["State"].split(" ")[0],
+               "queue":f["Partition"] }
+    try: record["nodes"] = int(f["NNodes"])
+    except ValueError: record["nodes"] = None
+    try: record["energy"] = float(f["ConsumedEnergyRaw"])
+    except ValueError: record["energy"] = None
+    records[ record["jobid"] ] = record
+  return records
+
+def add_intervals(record):
+  ## queue wait and elapsed time, where the timestamps are known
+  submit,start,end = record["submit"],record["start"],record["end"]
+  record["wait"] = start-submit if submit is not None and start is not None else None
+  record["elapsed"] = end-start if start is not None and end is not None else None
+  return record
+
+def percentile(values,p):
+  ## nearest-rank percentile of a nonempty list
+  values = sorted(values)
+  rank = max( math.ceil( p/100*len(values) ),1 )
+  return values[ min(rank,len(values))-1 ]
+
+def busy_time(records):
+  ## length of the union of the [start,end] intervals: time that anything was running
+  intervals = sorted( [ (r["start"],r["end"]) for r in records
+                        if r["start"] is not None and r["end"] is not None ] )
+  busy = 0.; current = None
+  for start,end in intervals:
+    if current is None or start>current[1]:
+      if current is not None: busy += current[1]-current[0]
+      current = [start,end]
+    else:
+      current[1] = max(current[1],end)
+  if current is not None: busy += current[1]-current[0]
+  return busy
+
+def allocations(records):
+  ## one record per slurm job id: the jobs of a pack share the record of their allocation
+  seen = {}
+  for r in records:
+    seen.setdefault( r["jobid"],r )
+  return list( seen.values() )
+
+def campaign_metrics(records):
+  #
+  # records: list of dicts with name, jobid, queue, nodes, submit, start, end, wait, elapsed,
+  # exitcode, state, energy; return makespan, throughput, and queue waits per queue;
+  # node-hours, busy time, energy, and waits are counted once per slurm job id
+  #
+  allocated = allocations(records)
+  submits = [ r["submit"] for r in records if r["submit"] is not None ]
+  ends = [ r["end"] for r in records if r["end"] is not None ]
+  metrics = { "njobs":len(records),"start":None,"makespan":None,"jobs_per_hour":None,
+              "busy":busy_time(allocated),"nodehours":0.,"energy":None,"failed":0,"queues":{} }
+  if len(submits)>0 and len(ends)>0:
+    metrics["start"] = min(submits)
+    metrics["makespan"] = max(ends)-min(submits)
+    if metrics["makespan"]>0:
+      metrics["jobs_per_hour"] = len(ends)/metrics["makespan"]*3600
+  for r in allocated:
+    if r["elapsed"] is not None and r["nodes"]:
+      metrics["nodehours"] += r["nodes"]*r["elapsed"]/3600
+    if r["energy"] is not None:
+      metrics["energy"] = ( metrics["energy"] or 0. )+r["energy"]
+  for r in records:
+    if r["state"] in failed_states or r["exitcode"] not in [ None,"0:0" ]:
+      metrics["failed"] += 1
+  queues = {}
+  for r in allocated:
+    if r["wait"] is not None:
+      queues.setdefault( r["queue"],[] ).append( r["wait"] )
+  for q,waits in sorted( queues.items() ):
+    metrics["queues"][q] = { "njobs":len(waits),"mean":statistics.mean(waits),
+                             "p50":percentile(waits,50),"p90":percentile(waits,90),
+                             "max":max(waits) }
+  return metrics
+
+def timeline_table(records,start=None):
+  #
+  # tab-separated Gantt table, one line per job, ordered by start time;
+  # times are in seconds relative to the start of the campaign
+  #
+  columns = [ "name","jobid","queue","nodes","submit","start","end",
+              "wait","elapsed","exitcode","state","energy" ]
+  lines = [ "\t".join(columns) ]
+  for r in sorted( records,key=lambda r:( r["start"] is None,r["start"] or 0,r["name"] ) ):
+    fields = []
+    for c in columns:
+      v = r[c]
+      if c in [ "submit","start","end" ] and v is not None and start is not None:
+        v -= start
+      fields.append( "" if v is None else f"{v:.6g}" if isinstance(v,float) else str(v) )
+    lines.append( "\t".join(fields) )
+  return "\n".join(lines)+"\n"
+
+def hms(seconds):
+  seconds = int(round(seconds))
+  return f"{seconds//3600}:{seconds//60%60:02}:{seconds%60:02}"
+
+def timeline_summary(metrics,name,source):
+  summary = f"Timeline of {name}: {metrics['njobs']} jobs, timestamps from {source}\n"
+  if metrics["makespan"] is None:
+    return summary+"  no completed jobs\n"
+  started = time.strftime( "%Y-%m-%d %H:%M:%S",time.localtime(metrics["start"]) )
+  makespan = metrics["makespan"]; busy = metrics["busy"]
+  summary += f"  first submission {started}, makespan {hms(makespan)}\n"
+  if metrics["jobs_per_hour"] is not None:
+    summary += f"  throughput {metrics['jobs_per_hour']:.3g} jobs/hour\n"
+  if makespan>0:
+    summary += f"  something running {hms(busy)} ({100*busy/makespan:.1f}%)," \
+      +f" nothing running {hms(makespan-busy)} ({100*(makespan-busy)/makespan:.1f}%)\n"
+  summary += f"  {metrics['nodehours']:.3g} node-hours used"
+  if metrics["energy"] is not None:
+    summary += f", {metrics['energy']:.4g} J consumed"
+  summary += f", {metrics['failed']} jobs failed\n"
+  for q,w in metrics["queues"].items():
+    summary += f"  queue {q}: {w['njobs']} slurm jobs, wait mean {hms(w['mean'])}" \
+      +f" p50 {hms(w['p50'])} p90 {hms(w['p90'])} max {hms(w['max'])}\n"
+  return summary